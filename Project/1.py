@@ -6,7 +6,7 @@ import vizro.plotly.express as px
 import vizro.models as vm
 from vizro.managers import data_manager
 from utils.supabase import select
-from statsmodels.stats.proportion import proportions_chisquare
+from utils.stats import proportions_chisquare_batch
 
 
 SQL_TEMPLATE = """
@@ -25,15 +25,15 @@ GROUP BY
 """
 
 
-def proportions_chi2(row: pd.Series) -> float:
+def proportions_chi2(df: pd.DataFrame) -> pd.Series:
     """
-    Вычисляет p-value для статистики хи-квадрат.
+    Вычисляет p-value для статистики хи-квадрат сразу для всех строк.
     """
-    _, pval, _ = proportions_chisquare(
-        count=[row['cnt_desktop'], row['cnt_touch']],
-        nobs=[row['platform_total_desktop'], row['platform_total_touch']]
+    _, pval = proportions_chisquare_batch(
+        count=df[['cnt_desktop', 'cnt_touch']],
+        nobs=df[['platform_total_desktop', 'platform_total_touch']]
     )
-    return pval
+    return pd.Series(pval, index=df.index)
 
 # Настройки стилей
 CELL_STYLE = {
@@ -54,15 +54,15 @@ COLUMN_DEFS = [
     {"field": "pval", "valueFormatter": {"function": "d3.format(',.3f')(params.value)"}, "cellStyle": CELL_STYLE},
 ]
 
-def proportions_chi2(row: pd.Series) -> float:
+def proportions_chi2(df: pd.DataFrame) -> pd.Series:
     """
-    Вычисляет p-value для статистики хи-квадрат.
+    Вычисляет p-value для статистики хи-квадрат сразу для всех строк.
     """
-    _, pval, _ = proportions_chisquare(
-        count=[row['cnt_desktop'], row['cnt_touch']],
-        nobs=[row['platform_total_desktop'], row['platform_total_touch']]
+    _, pval = proportions_chisquare_batch(
+        count=df[['cnt_desktop', 'cnt_touch']],
+        nobs=df[['platform_total_desktop', 'platform_total_touch']]
     )
-    return pval
+    return pd.Series(pval, index=df.index)
 
 def get_table_data(sql=SQL_TEMPLATE, min_cnt=50, range=['2021-09-01', '2021-09-21']) -> pd.DataFrame:
     """
@@ -89,7 +89,7 @@ def get_table_data(sql=SQL_TEMPLATE, min_cnt=50, range=['2021-09-01', '2021-09-2
     )
 
     # Добавление вычисляемых колонок
-    df_pivoted["pval"] = df_pivoted.apply(proportions_chi2, axis=1)
+    df_pivoted["pval"] = proportions_chi2(df_pivoted)
     df_pivoted['pct_desktop'] = df_pivoted['cnt_desktop'] / df_pivoted['platform_total_desktop']
     df_pivoted['pct_touch'] = df_pivoted['cnt_touch'] / df_pivoted['platform_total_touch']
     print(df_pivoted)
@@ -2,7 +2,7 @@ from vizro import Vizro
 from dash import dcc
 import pandas as pd
 import vizro.models as vm
-from dash import Input, Output, callback
+from dash import Input, Output, State, callback, no_update
 from vizro.models.types import capture
 import plotly.graph_objects as go
 import vizro.plotly.express as px
@@ -11,8 +11,10 @@ from plotly.express import density_heatmap
 from vizro.tables import dash_ag_grid
 from utils.helpers import outliers_line_plot, components_plot, heatmap_plot, fig_kpi_date, fig_kpi_touch, fig_kpi_desk, fig_graph_pie, butterfly, linechart_query_plot
 from utils.supabase import select
-from utils.data_loader import data_manager
+from utils.data_loader import data_manager, warm_up
 from utils.table import get_table_data
+from utils.downsample import relayout_x_range
+from utils.grid import TABLE_ROW_MODEL, get_rows, server_side_grid
 
 # Overview page
 ## KPI Container with multiple graphs
@@ -47,6 +49,30 @@ line_charts_tabbed = vm.Tabs(
     ]
 )
 
+# Zooming into a forecast chart re-renders it at full resolution for the visible window,
+# resetting the zoom goes back to the downsampled series of the selected dates
+def register_forecast_zoom(platform):
+    @callback(
+        Output(f"forecast_graph_{platform}", "figure", allow_duplicate=True),
+        Input(f"forecast_graph_{platform}", "relayoutData"),
+        State("dates_selector_p1", "value"),
+        prevent_initial_call=True,
+    )
+    def zoom_forecast(relayout_data, date_range):
+        x_range = relayout_x_range(relayout_data)
+        if x_range is False:
+            return no_update
+        data_frame = data_manager[f"forecast_{platform}"].load()
+        # The page's date filter is only applied by Vizro's own renders, so it is applied here too
+        if date_range and all(date_range):
+            start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1])
+            data_frame = data_frame[data_frame['ds'].dt.normalize().between(start, end)]
+        return outliers_line_plot(data_frame=data_frame, x_range=x_range)
+
+
+for platform in ["touch", "desktop"]:
+    register_forecast_zoom(platform)
+
 # Page Overview layout with KPI and Line Charts
 page_overview = vm.Page(
     title="Overview Dashboard",
@@ -137,13 +163,14 @@ COLUMN_DEFS = [
     {"field": "P-value", "valueFormatter": {"function": "d3.format(',.3f')(params.value)"}, "cellStyle": CELL_STYLE},
 ]
 
-# Creating AgGrid for query data
+# Creating AgGrid for query data; in the infinite row model only the visible block of rows is sent
+table_function = server_side_grid if TABLE_ROW_MODEL == "infinite" else dash_ag_grid
 table_grid = vm.AgGrid(
     id='ag',
-    figure=dash_ag_grid(id='dag', data_frame='data_table', columnDefs=COLUMN_DEFS,
-                         defaultColDef={"resizable": False, "filter": True, "editable": False},
-                         dashGridOptions={"pagination": True, "paginationPageSize": 10},
-                         columnSize="responsiveSizeToFit"),
+    figure=table_function(id='dag', data_frame='data_table', columnDefs=COLUMN_DEFS,
+                           defaultColDef={"resizable": False, "filter": True, "editable": False},
+                           dashGridOptions={"pagination": True, "paginationPageSize": 10},
+                           columnSize="responsiveSizeToFit"),
     title="Queries counts and statistical significance of the difference between platforms",
 )
 
@@ -192,6 +219,25 @@ page_queries_text_detailed = vm.Page(
     ]
 )
 
+# Blocks of the query table are sorted, filtered and sliced on the server from a cached view
+if TABLE_ROW_MODEL == "infinite":
+    @callback(
+        Output("dag", "getRowsResponse"),
+        Input("dag", "getRowsRequest"),
+        State("date_filter", "value"),
+        State("min_query_count_filter", "value"),
+        prevent_initial_call=True,
+    )
+    def serve_table_rows(request, date_range, min_cnt):
+        if not request:
+            return no_update
+        return get_rows(
+            lambda: data_manager["data_table"].load(min_cnt=min_cnt, date_range=date_range),
+            request,
+            key=("data_table", min_cnt, tuple(date_range)),
+        )
+
+
 # Final Dashboard setup with multiple pages and navigation
 dashboard = vm.Dashboard(
     title="Yandex Queries Overview",
@@ -210,4 +256,12 @@ dashboard = vm.Dashboard(
 )
 
 # Running the dashboard with Vizro
-Vizro().build(dashboard).run()
+app = Vizro().build(dashboard)
+# Load data sources in the background once the server handles its first request, also when
+# a WSGI server imports ``app``; pages show a loading state until they are ready
+app.dash.server.before_request(warm_up)
+
+if __name__ == "__main__":
+    # Guarded so that forecasting worker processes importing this module do not start the server
+    warm_up()  # Start loading before the first request when run directly
+    app.run()
@@ -0,0 +1,108 @@
+"""
+Compare the single-pass linechart query with the previous two-scan version.
+
+Run from the Project directory:
+
+    python -m benchmarks.linechart_sql --synthetic
+    python -m benchmarks.linechart_sql --start 2021-09-08 --end 2021-09-21
+
+With --synthetic a generated cube is queried through the local DuckDB backend,
+otherwise the configured backend (DATA_BACKEND) is used.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+
+# Previous version: only the top-5 CTE is range-filtered, the outer query scans all dates
+SQL_LEGACY = """
+WITH t AS (
+    SELECT
+        query,
+        hour,
+        SUM(cnt) AS cnt,
+        ROW_NUMBER() OVER (PARTITION BY hour ORDER BY SUM(cnt) DESC) AS rnb
+    FROM
+        vizro.yandex_query_cube c
+    WHERE
+        date BETWEEN :start_date AND :end_date
+    GROUP BY query, hour
+)
+SELECT
+    platform,
+    hour,
+    query,
+    SUM(cnt)::int AS count
+FROM
+    vizro.yandex_query_cube c
+WHERE
+    query IN (SELECT DISTINCT query FROM t WHERE rnb < 6)
+GROUP BY
+    platform, hour, query
+"""
+
+
+def make_synthetic_cube(days=180, queries=20_000, rows=2_000_000, seed=0, end='2021-09-21'):
+    """
+    Generate a cube with a Zipf-like query popularity over ``days`` days up to ``end``.
+    """
+    rng = np.random.default_rng(seed)
+    cube = pd.DataFrame({
+        'date': (pd.Timestamp(end) - pd.to_timedelta(rng.integers(0, days, rows), 'D')).date,
+        'hour': rng.integers(0, 24, rows).astype('int16'),
+        'platform': rng.choice(['touch', 'desktop'], rows),
+        'query': np.char.add('query ', rng.zipf(1.3, rows).clip(max=queries).astype(str)),
+        'cnt': rng.integers(1, 50, rows).astype('int32'),
+    })
+    return cube.groupby(['date', 'hour', 'platform', 'query'], as_index=False)['cnt'].sum()
+
+
+def timeit(fn, repeat):
+    fn()  # warm-up, e.g. statement preparation
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return result, timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--start', default='2021-09-08')
+    parser.add_argument('--end', default='2021-09-21')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--synthetic', action='store_true', help='query a generated cube with DuckDB')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        os.environ['DATA_BACKEND'] = 'local'
+        os.environ['LOCAL_DATA_DIR'] = tempfile.mkdtemp(prefix='linechart_bench_')
+
+    from utils import supabase
+    from utils.data_loader import SQL_TEMPLATE_QUERY_LINECHART
+
+    if args.synthetic:
+        supabase.local_backend.write_table('vizro.yandex_query_cube', [make_synthetic_cube()])
+
+    params = SQL_TEMPLATE_QUERY_LINECHART.bind(start_date=args.start, end_date=args.end)
+    legacy, legacy_ms = timeit(lambda: supabase.select(SQL_LEGACY, params=params, cache=False), args.repeat)
+    current, current_ms = timeit(
+        lambda: supabase.select(SQL_TEMPLATE_QUERY_LINECHART, params=params, cache=False), args.repeat
+    )
+
+    print(f"{'query':<14}{'median ms':>12}{'min ms':>10}{'rows':>8}{'queries':>9}{'total count':>13}")
+    for name, df, timings in [('legacy', legacy, legacy_ms), ('single-pass', current, current_ms)]:
+        print(f"{name:<14}{statistics.median(timings):>12.1f}{min(timings):>10.1f}"
+              f"{len(df):>8}{df['query'].nunique():>9}{int(df['count'].sum()):>13}")
+    print(f"speed-up: {statistics.median(legacy_ms) / statistics.median(current_ms):.2f}x "
+          f"(the legacy counts cover all dates, the single-pass counts only the selected range)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""
+Benchmark the data loaders and chart builders against a synthetic dataset.
+
+Run from the Project directory:
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --days 30 180 --save benchmarks/baseline.json
+    python -m benchmarks.suite --days 30 180 --baseline benchmarks/baseline.json
+
+Every case runs at each --days size against generated yandex_data_agg and
+yandex_query_cube tables, served by the local DuckDB backend as a stand-in for
+Postgres. The median time, the peak Python memory (tracemalloc, which includes
+numpy and pandas buffers but not DuckDB's own memory) and, for charts, the
+serialized figure size are recorded.
+
+With --baseline the run fails (exit code 1) when a metric exceeds the baseline
+by more than its tolerance, so performance work can be checked against a saved run.
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from benchmarks.linechart_sql import make_synthetic_cube
+
+
+END_DATE = pd.Timestamp('2021-09-21 23:00')
+DATE_RANGE = ['2021-09-08', '2021-09-21']
+
+
+def make_synthetic_agg(days, seed=0):
+    """
+    Generate yandex_data_agg with hourly, daily and weekly counts per platform over ``days`` days.
+    """
+    rng = np.random.default_rng(seed)
+    hours = pd.date_range(end=END_DATE, periods=days * 24, freq='h')
+    frames = []
+    for platform, level in [('touch', 900), ('desktop', 600)]:
+        # Daily and weekly seasonality with noise
+        shape = 1 + 0.5 * np.sin(2 * np.pi * hours.hour / 24) + 0.2 * (hours.weekday < 5)
+        hourly = pd.Series(rng.poisson(level * shape), index=hours)
+        for scale, counts in [
+            ('hours', hourly),
+            ('days', hourly.resample('D').sum()),
+            ('weeks', hourly.resample('W-MON', label='left', closed='left').sum()),
+        ]:
+            frames.append(pd.DataFrame({
+                'ds': counts.index, 'platform': platform, 'scale': scale, 'count': counts.to_numpy(),
+            }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def measure(fn, repeat, setup=None):
+    """
+    Run ``fn`` ``repeat`` times after one warm-up run. Returns the last result, the
+    timings in ms and the peak traced memory in MiB of one extra traced run.
+    """
+    if setup:
+        setup()
+    fn()
+    timings = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, timings, peak / 2 ** 20
+
+
+def payload_bytes(result):
+    """
+    Serialized size of a figure as sent to the browser, None for other results.
+    """
+    return len(result.to_json()) if isinstance(result, go.Figure) else None
+
+
+def cases(days):
+    """
+    (name, function, setup, repeat) of every benchmarked loader and chart at one data size.
+    Imports are deferred until the local backend is configured.
+    """
+    from utils import supabase
+    from utils import data_loader as dl
+    from utils import helpers
+
+    agg = dl.PartitionedFrame(supabase.select("SELECT * FROM vizro.yandex_data_agg", cache=False))
+    heatmap = dl.get_heatmap_data(agg)
+    forecast = dl.make_forecast(agg, 'h', 'touch', use_store=False)
+    table_args = dict(min_cnt=50, date_range=DATE_RANGE)
+    butterfly = dl.get_butterfly_data(**table_args)
+    linechart = dl.get_query_linechart_data(date_range=DATE_RANGE)
+
+    def no_cache():
+        supabase.query_cache.clear()
+
+    return [
+        ('select agg_data', lambda: supabase.select("SELECT * FROM vizro.yandex_data_agg", cache=False), None, 5),
+        ('make_forecast', lambda: dl.make_forecast(agg, 'h', 'touch', use_store=False), None, 1),
+        ('get_heatmap_data', lambda: dl.get_heatmap_data(agg), None, 5),
+        ('get_kpi_data', lambda: dl.get_kpi_summaries(agg), None, 5),
+        ('get_table_data', lambda: dl.get_table_data(**table_args), no_cache, 5),
+        ('get_butterfly_data', lambda: dl.get_butterfly_data(**table_args), no_cache, 5),
+        ('get_query_linechart_data', lambda: dl.get_query_linechart_data(date_range=DATE_RANGE), no_cache, 5),
+        ('outliers_line_plot', lambda: helpers.outliers_line_plot(forecast), None, 5),
+        ('components_plot', lambda: helpers.components_plot(forecast), None, 5),
+        ('heatmap_plot', lambda: helpers.heatmap_plot(heatmap, z='wow_diff_%'), None, 5),
+        ('butterfly', lambda: helpers.butterfly(
+            butterfly, x=["pct_desktop", "pct_touch"], y="query", hover_name="query",
+            hover_data={'query': False, 'count_desktop': True, 'count_touch': True},
+        ), None, 5),
+        ('linechart_query_plot', lambda: helpers.linechart_query_plot(linechart), None, 5),
+    ]
+
+
+def run(days_list, repeat_scale, only):
+    from utils import supabase
+
+    results = {}
+    for days in days_list:
+        supabase.local_backend.write_table('vizro.yandex_data_agg', [make_synthetic_agg(days)])
+        supabase.local_backend.write_table('vizro.yandex_query_cube', [make_synthetic_cube(
+            days=days, rows=days * 10_000, end=END_DATE.normalize(),
+        )])
+        supabase.query_cache.clear()
+        for name, fn, setup, repeat in cases(days):
+            if only and name not in only:
+                continue
+            result, timings, peak = measure(fn, max(int(repeat * repeat_scale), 1), setup)
+            results[f"{name}@{days}d"] = {
+                'median_ms': statistics.median(timings),
+                'peak_mib': peak,
+                'payload_bytes': payload_bytes(result),
+            }
+            print_row(f"{name}@{days}d", results[f"{name}@{days}d"])
+    return results
+
+
+def print_row(name, metrics):
+    payload = metrics['payload_bytes']
+    print(f"{name:<32}{metrics['median_ms']:>12.1f}{metrics['peak_mib']:>12.1f}"
+          f"{(f'{payload / 1024:.1f}' if payload is not None else '-'):>14}", flush=True)
+
+
+def regressions(results, baseline, tolerances):
+    """
+    Metrics of ``results`` exceeding their ``baseline`` value by more than the relative tolerance.
+    """
+    failures = []
+    for name, metrics in results.items():
+        for metric, tolerance in tolerances.items():
+            current, reference = metrics.get(metric), baseline.get(name, {}).get(metric)
+            if current is None or not reference:
+                continue
+            if current > reference * (1 + tolerance):
+                failures.append(f"{name} {metric}: {current:.1f} > {reference:.1f} (+{tolerance:.0%} allowed)")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, nargs='+', default=[30, 180], help='data sizes in days of history')
+    parser.add_argument('--repeat-scale', type=float, default=1.0, help='multiplier of the repeats per case')
+    parser.add_argument('--only', nargs='+', help='run only these cases')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with the results in this JSON file')
+    parser.add_argument('--time-tolerance', type=float, default=0.5)
+    parser.add_argument('--memory-tolerance', type=float, default=0.25)
+    parser.add_argument('--payload-tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+
+    os.environ['DATA_BACKEND'] = 'local'
+    logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
+    os.environ['LOCAL_DATA_DIR'] = tempfile.mkdtemp(prefix='benchmark_suite_')
+
+    print(f"{'case':<32}{'median ms':>12}{'peak MiB':>12}{'payload kB':>14}")
+    results = run(args.days, args.repeat_scale, args.only)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = regressions(results, baseline, {
+            'median_ms': args.time_tolerance,
+            'peak_mib': args.memory_tolerance,
+            'payload_bytes': args.payload_tolerance,
+        })
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == '__main__':
+    main()
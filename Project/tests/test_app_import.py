@@ -0,0 +1,37 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imports app.py the way a forecasting worker process does (as __mp_main__) and reports
+# the lazy sources that were started and the queries that were run
+WORKER_IMPORT = """
+import json, runpy
+from utils import supabase
+queries = []
+read_sql = supabase._read_sql
+supabase._read_sql = lambda sql, *args, **kwargs: queries.append(str(sql)) or read_sql(sql, *args, **kwargs)
+runpy.run_path('app.py', run_name='__mp_main__')
+from utils import data_loader
+started = [source.name for source in data_loader.lazy_sources if source._thread is not None]
+print(json.dumps({'started': started, 'queries': queries}))
+"""
+
+
+@pytest.mark.skipif(
+    importlib.util.find_spec("utils.env_add") is None, reason="app.py needs the local utils/env_add.py settings"
+)
+def test_worker_import_runs_no_loaders(tmp_path):
+    env = dict(os.environ, DATA_BACKEND="local", LOCAL_DATA_DIR=str(tmp_path), PYTHONPATH=PROJECT)
+    result = subprocess.run(
+        [sys.executable, "-c", WORKER_IMPORT], cwd=PROJECT, env=env, capture_output=True, text=True, timeout=300
+    )
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report == {'started': [], 'queries': []}
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from statsmodels.stats.proportion import proportions_chisquare
+
+from utils.stats import proportions_chisquare_batch
+
+
+def reference(count, nobs):
+    """
+    statsmodels' proportions_chisquare applied row by row.
+    """
+    results = [proportions_chisquare(np.asarray(c), np.asarray(n))[:2] for c, n in zip(count, nobs)]
+    return np.array([r[0] for r in results]), np.array([r[1] for r in results])
+
+
+def test_random_rows_match_statsmodels():
+    rng = np.random.default_rng(0)
+    nobs = rng.integers(1, 10_000, size=(2000, 2))
+    count = rng.integers(0, nobs + 1)
+
+    chi2stat, pval = proportions_chisquare_batch(count, nobs)
+    expected_chi2stat, expected_pval = reference(count, nobs)
+
+    np.testing.assert_allclose(chi2stat, expected_chi2stat, rtol=1e-10)
+    np.testing.assert_allclose(pval, expected_pval, rtol=1e-10)
+
+
+@pytest.mark.parametrize("count, nobs", [
+    ([0, 0], [10, 20]),     # no successes in either sample
+    ([10, 20], [10, 20]),   # only successes in both samples
+    ([0, 0], [0, 0]),       # empty samples
+])
+def test_degenerate_tables_match_statsmodels(count, nobs):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected_chi2stat, expected_pval = reference([count], [nobs])
+    chi2stat, pval = proportions_chisquare_batch([count], [nobs])
+
+    assert np.isnan(chi2stat[0]) and np.isnan(expected_chi2stat[0])
+    assert np.isnan(pval[0]) and np.isnan(expected_pval[0])
+
+
+def test_degenerate_rows_do_not_affect_others():
+    count = np.array([[0, 0], [30, 45], [10, 20]])
+    nobs = np.array([[10, 20], [100, 90], [10, 20]])
+
+    chi2stat, pval = proportions_chisquare_batch(count, nobs)
+    expected_chi2stat, expected_pval = reference(count[1:2], nobs[1:2])
+
+    assert np.isnan(chi2stat[[0, 2]]).all() and np.isnan(pval[[0, 2]]).all()
+    np.testing.assert_allclose(chi2stat[1], expected_chi2stat[0], rtol=1e-10)
+    np.testing.assert_allclose(pval[1], expected_pval[0], rtol=1e-10)
@@ -0,0 +1,176 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from utils.dictionary import query_dictionary
+
+
+_SQL_LITERAL = re.compile(r"('(?:[^']|'')*')")
+
+
+def normalize_sql(sql):
+    """
+    Collapse whitespace outside of string literals so that differently formatted
+    copies of the same statement share one cache key.
+    """
+    parts = _SQL_LITERAL.split(sql)
+    # Odd positions hold the quoted literals, which must be kept verbatim
+    parts[::2] = [re.sub(r"\s+", " ", part) for part in parts[::2]]
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def make_key(sql, params=None):
+    """
+    Build a hashable cache key from the normalized SQL text and the bound parameters.
+    """
+    params = tuple(sorted((name, repr(value)) for name, value in (params or {}).items()))
+    return normalize_sql(sql), params
+
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    """
+    Estimate the memory footprint of a DataFrame, including object columns.
+    Dictionary-encoded columns count only their codes, their categories are shared
+    by all frames (see utils.dictionary).
+    """
+    nbytes = df.index.memory_usage(deep=True)
+    for _, column in df.items():
+        if query_dictionary.owns(column.dtype):
+            nbytes += column.array.codes.nbytes
+        else:
+            nbytes += column.memory_usage(index=False, deep=True)
+    return int(nbytes)
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Hash the content of a DataFrame: values, index, column names and dtypes.
+    Dictionary-encoded columns are hashed by their codes, which identify the same text
+    however much the dictionary has grown.
+    """
+    encoded = [query_dictionary.owns(dtype) for dtype in df.dtypes]
+    digest = hashlib.sha1()
+    digest.update(repr(list(df.columns)).encode())
+    digest.update(repr(df.dtypes.astype(str).tolist()).encode())
+    if any(encoded):
+        digest.update(f"{query_dictionary.name}:{encoded}".encode())
+        df = pd.DataFrame({
+            i: column.array.codes if is_encoded else column.array
+            for i, ((_, column), is_encoded) in enumerate(zip(df.items(), encoded))
+        }, index=df.index)
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe memoizing cache.
+
+    Entries expire after ``ttl`` seconds and the least recently used ones are
+    evicted once the total ``sizeof`` of the cached values exceeds ``max_bytes``.
+    Concurrent requests for the same key wait for a single in-flight load.
+    """
+
+    def __init__(self, max_bytes=256 * 2 ** 20, ttl=600.0, sizeof=len):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()  # key -> (value, nbytes, expires_at)
+        self._inflight = {}  # key -> threading.Event
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key, loader):
+        """
+        Return the cached value for ``key`` or call ``loader`` to compute it.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[2] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                if entry is not None:
+                    self._drop(key)
+                pending = self._inflight.get(key)
+                if pending is None:
+                    pending = self._inflight[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another thread is already computing this value, wait for it and retry
+            pending.wait()
+
+        try:
+            value = loader()
+            with self._lock:
+                self._store(key, value)
+        finally:
+            with self._lock:
+                self._inflight.pop(key).set()
+        return value
+
+    def clear(self):
+        """
+        Drop all cached entries, keeping the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict:
+        """
+        Return hit/miss counters and the current cache occupancy.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _store(self, key, value):
+        nbytes = self.sizeof(value)
+        if nbytes > self.max_bytes:
+            # Never cache a value that would flush everything else
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (value, nbytes, time.monotonic() + self.ttl)
+        self.nbytes += nbytes
+        while self.nbytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _drop(self, key):
+        _, nbytes, _ = self._entries.pop(key)
+        self.nbytes -= nbytes
+
+
+class QueryCache(LRUCache):
+    """
+    LRUCache of query results keyed by normalized SQL text and bound parameters.
+    """
+
+    def __init__(self, max_bytes=256 * 2 ** 20, ttl=600.0):
+        super().__init__(max_bytes=max_bytes, ttl=ttl, sizeof=frame_nbytes)
+
+    def get_or_load(self, sql, params, loader) -> pd.DataFrame:
+        """
+        Return the cached result for ``sql``/``params`` or call ``loader`` to fetch it.
+        A shallow copy is returned: callers are free to add or modify columns, and
+        copy-on-write keeps the cached frame intact without copying its data.
+        """
+        return super().get_or_load(make_key(sql, params), loader).copy(deep=False)
@@ -1,46 +1,135 @@
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 from vizro.managers import data_manager
 from prophet import Prophet
-from utils.supabase import select
-from statsmodels.stats.proportion import proportions_chisquare
+from utils.supabase import DATA_BACKEND, execute, select, select_iter
+from utils.stats import proportions_chisquare_batch
+from utils.forecast_store import fingerprint, forecast_store
+from utils.partitions import PartitionedFrame
+from utils.queries import QueryTemplate
+from utils.dictionary import decode_queries, query_dictionary
+from utils.schemas import PLATFORM, SCALE, apply_schema
+from utils import lazy
+from utils.lazy import LazySource, empty_frame, placeholder_frame
+
+
+logger = logging.getLogger(__name__)
 
 
 # Transformer Functions
+# Transformers take agg_data either as a DataFrame or as a PartitionedFrame by scale and platform
 
-def get_kpi_data(df, platform="touch"):
+def _rows(df, **values):
     """
-    Prepare data for KPI visualization by filtering for a specific platform
-    and calculating the previous period's actual values.
+    Rows of ``df`` whose columns equal ``values``; a partition lookup for a PartitionedFrame.
+    """
+    if isinstance(df, PartitionedFrame) and set(values) <= set(df.keys):
+        return df.select(**values)
+    df = _frame(df)
+    mask = np.logical_and.reduce([(df[column] == value).to_numpy() for column, value in values.items()])
+    return df[mask]
+
+
+def _frame(df):
+    return df.frame if isinstance(df, PartitionedFrame) else df
+
+
+def get_kpi_summaries(df):
+    """
+    Prepare the KPI data of every platform in one pass over ``df``: the actual count and
+    the previous period's count per (platform, scale, ds), sorted by scale and date, so
+    the last row left by the scale and date filters holds the latest values.
+    Returns a dict mapping each platform to its frame.
     """
     result = (
-        df.query("platform == @platform")
+        _frame(df)[['ds', 'platform', 'scale', 'count']]
           .rename(columns={"count": "actual"})
-          .sort_values(by=['scale', 'ds'])
+          .sort_values(by=['platform', 'scale', 'ds'], ignore_index=True)
     )
-    result["previous"] = result.groupby('scale')["actual"].shift(1)
-    return result
+    result["previous"] = result.groupby(['platform', 'scale'])["actual"].shift(1)
+    return {platform: part.reset_index(drop=True) for platform, part in result.groupby('platform', sort=False)}
+
+
+def get_kpi_data(df, platform="touch"):
+    """
+    Prepare data for KPI visualization by filtering for a specific platform
+    and calculating the previous period's actual values.
+    """
+    return get_kpi_summaries(_rows(df, platform=platform)).get(platform, empty_frame(**KPI_SCHEMA))
 
 
 def get_pie_data(df):
     """
     Prepare data for the pie chart by selecting relevant columns.
     """
-    return df[['ds', 'platform', 'count', 'scale']]
+    return _frame(df)[['ds', 'platform', 'count', 'scale']]
+
+
+def _hourly_series(df, platform, group_col='platform'):
+    """
+    Select the hourly series of one group in the format expected by Prophet.
+    """
+    return (
+        _rows(df, scale='hours', **{group_col: platform})
+          [['ds', 'count']]
+          .rename(columns={'count': 'y'})
+          .reset_index(drop=True)
+    )
+
+
+# Forecast columns used by the charts; Prophet's other component and bound columns are dropped
+FORECAST_COLUMNS = ['ds', 'y', 'yhat', 'yhat_lower', 'yhat_upper', 'trend', 'weekly', 'daily']
+
+
+def _finalize_forecast(forecast, history):
+    """
+    Add historical values, ensure no negative predictions and keep only FORECAST_COLUMNS.
+    """
+    forecast['y'] = forecast[['ds']].merge(history, on='ds', how='left')['y'].values
+    for col in ['yhat', 'yhat_lower']:
+        forecast[col] = forecast[col].clip(lower=0.0)
+    return apply_schema(forecast[FORECAST_COLUMNS], 'forecast')
+
+
+def _warm_start_params(model):
+    """
+    Extract fitted parameters of a Prophet model to initialize the next fit.
+    """
+    init = {name: model.params[name][0][0] for name in ['k', 'm', 'sigma_obs']}
+    init.update({name: model.params[name][0] for name in ['delta', 'beta']})
+    return init
 
 
 def make_forecast(
     df, freq, platform, periods=0, daily_seasonality=True,
-    weekly_seasonality=True, yearly_seasonality=False, interval_width=0.95
+    weekly_seasonality=True, yearly_seasonality=False, interval_width=0.95, use_store=True,
+    group_col='platform'
 ):
     """
     Generate a forecast using the Prophet library for a specified platform and frequency.
+    ``platform`` is matched against ``group_col``, so any grouping column can be forecasted.
+    Forecasts are reused from ``forecast_store`` when the input series and settings are unchanged.
     """
-    filtered_df = (
-        df.query("scale == 'hours' & platform == @platform")
-          [['ds', 'count']]
-          .rename(columns={'count': 'y'})
-          .reset_index(drop=True)
+    filtered_df = _hourly_series(df, platform, group_col)
+    params = dict(
+        freq=freq, periods=periods, daily_seasonality=daily_seasonality,
+        weekly_seasonality=weekly_seasonality, yearly_seasonality=yearly_seasonality,
+        interval_width=interval_width
     )
+    key = fingerprint(filtered_df, params)
+    if use_store:
+        forecast = forecast_store.load(key)
+        if forecast is not None:
+            # Entries stored before FORECAST_COLUMNS was applied hold all of Prophet's columns
+            return forecast[FORECAST_COLUMNS]
+
     model = Prophet(
         daily_seasonality=daily_seasonality,
         weekly_seasonality=weekly_seasonality,
@@ -49,47 +138,316 @@ def make_forecast(
     )
     model.fit(filtered_df)
     future = model.make_future_dataframe(freq=freq, periods=periods)
-    forecast = model.predict(future)
+    forecast = _finalize_forecast(model.predict(future), filtered_df)
 
-    # Add historical values and ensure no negative predictions
-    forecast['y'] = filtered_df['y']
-    for col in ['yhat', 'yhat_lower']:
-        forecast[col] = forecast[col].clip(lower=0.0)
+    if use_store:
+        forecast_store.save(key, forecast, model)
+    return forecast
+
+
+def update_forecast(
+    df, forecast, freq, platform, periods=0, daily_seasonality=True,
+    weekly_seasonality=True, yearly_seasonality=False, interval_width=0.95,
+    group_col='platform'
+):
+    """
+    Extend an existing forecast with the hourly rows of ``df`` newer than its last actual value.
 
+    The model is warm-started from the parameters of the previous fit (looked up in
+    ``forecast_store``) and only the new dates are predicted and appended. The extended
+    forecast replaces the previous entry in the store.
+    Falls back to a full make_forecast when the previous model is not available.
+    """
+    filtered_df = _hourly_series(df, platform, group_col)
+    params = dict(
+        freq=freq, periods=periods, daily_seasonality=daily_seasonality,
+        weekly_seasonality=weekly_seasonality, yearly_seasonality=yearly_seasonality,
+        interval_width=interval_width
+    )
+    last_ds = forecast.loc[forecast['y'].notna(), 'ds'].max()
+    if not (filtered_df['ds'] > last_ds).any():
+        return forecast
+
+    previous_history = filtered_df[filtered_df['ds'] <= last_ds].reset_index(drop=True)
+    previous_key = fingerprint(previous_history, params)
+    previous_model = forecast_store.load_model(previous_key)
+    if previous_model is None:
+        return make_forecast(
+            df, freq, platform, periods=periods, daily_seasonality=daily_seasonality,
+            weekly_seasonality=weekly_seasonality, yearly_seasonality=yearly_seasonality,
+            interval_width=interval_width, group_col=group_col
+        )
+
+    model = Prophet(
+        daily_seasonality=daily_seasonality,
+        weekly_seasonality=weekly_seasonality,
+        yearly_seasonality=yearly_seasonality,
+        interval_width=interval_width
+    )
+    model.fit(filtered_df, init=_warm_start_params(previous_model))
+    future = model.make_future_dataframe(freq=freq, periods=periods)
+    new_forecast = _finalize_forecast(model.predict(future[future['ds'] > last_ds]), filtered_df)
+
+    forecast = pd.concat([forecast[forecast['ds'] <= last_ds], new_forecast], ignore_index=True)
+    key = fingerprint(filtered_df, params)
+    forecast_store.save(key, forecast, model)
+    # The extended entry supersedes the previous one, which is never looked up again
+    if key != previous_key:
+        forecast_store.delete(previous_key)
     return forecast
 
 
-def get_heatmap_data(df):
+def _pool_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def make_forecasts(df, freq, group_col='platform', max_workers=None, **kwargs) -> dict:
     """
-    Prepare data for heatmap visualization by adding date, hour, and
-    week-over-week difference calculations.
+    Fit one forecast per value of ``group_col`` in parallel worker processes.
+    Returns a dict mapping each group to its forecast; ``kwargs`` are passed to make_forecast.
+    """
+    hourly = _rows(df, scale='hours')
+    groups = {name: group for name, group in hourly.groupby(group_col, sort=True, observed=True)}
+    workers = min(len(groups), max_workers or os.cpu_count() or 1)
+    if workers <= 1:
+        return {
+            name: make_forecast(group, freq, name, group_col=group_col, **kwargs)
+            for name, group in groups.items()
+        }
+
+    # Forking would copy the locks held by the server's and loaders' threads into the workers
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as pool:
+        futures = {
+            name: pool.submit(make_forecast, group, freq, name, group_col=group_col, **kwargs)
+            for name, group in groups.items()
+        }
+        return {name: future.result() for name, future in futures.items()}
+
+
+def register_forecasts(forecasts: dict, prefix='forecast_'):
+    """
+    Register each forecast (or a callable returning it) in data_manager as ``<prefix><group>``.
     """
-    filtered_df = df.query("scale == 'hours'").reset_index(drop=True)
+    for name, forecast in forecasts.items():
+        data_manager[f"{prefix}{name}"] = forecast
+
+
+def _heatmap_columns(df):
+    """
+    Keep hourly rows sorted by time and add date, hour and day-of-week columns.
+    """
+    filtered_df = _rows(df, scale='hours').reset_index(drop=True)
     filtered_df['date'] = filtered_df.ds.dt.date
     filtered_df['hour'] = filtered_df.ds.dt.hour
     filtered_df["dow"] = filtered_df.ds.dt.weekday + 1
-    filtered_df = filtered_df.sort_values(by='ds')
-    filtered_df['previous'] = filtered_df.groupby(["platform", "dow", "hour"])["count"].shift(1)
+    return filtered_df.sort_values(by='ds')
+
+
+def _add_wow_diff(filtered_df):
     filtered_df["wow_diff"] = filtered_df['count'] - filtered_df['previous']
     filtered_df["wow_diff_%"] = filtered_df["wow_diff"] * 100 / filtered_df['previous']
-
     return filtered_df[["ds", "date", "platform", "hour", "count", "wow_diff", "wow_diff_%"]]
 
 
+HEATMAP_SLOT = ["platform", "dow", "hour"]
+
+
+def get_heatmap_data(df):
+    """
+    Prepare data for heatmap visualization by adding date, hour, and
+    week-over-week difference calculations.
+    """
+    filtered_df = _heatmap_columns(df)
+    filtered_df['previous'] = filtered_df.groupby(HEATMAP_SLOT)["count"].shift(1)
+    return _add_wow_diff(filtered_df)
+
+
+def update_heatmap_data(heatmap_df, df):
+    """
+    Incremental variant of get_heatmap_data.
+
+    ``heatmap_df`` is a previous result, sorted by ``ds``, and ``df`` holds the rows of
+    agg_data from some time on, which replace the hourly rows of ``heatmap_df`` from that
+    time on. Week-over-week differences are computed only for the new rows, by looking up
+    the count of the same platform at ``ds - 7 days`` in the last week of ``heatmap_df``.
+    """
+    new = _heatmap_columns(df)
+    if new.empty:
+        return heatmap_df
+    since = new['ds'].min()
+    week = pd.Timedelta(7, 'days')
+    kept = heatmap_df.iloc[:heatmap_df['ds'].searchsorted(since)]
+    last_week = kept.iloc[kept['ds'].searchsorted(since - week):]
+
+    counts = pd.concat([last_week, new]).set_index(['platform', 'ds'])['count']
+    new['previous'] = counts.reindex(pd.MultiIndex.from_arrays([new['platform'], new['ds'] - week])).to_numpy()
+    return pd.concat([kept, _add_wow_diff(new)], ignore_index=True)
+
+
+HEATMAP_METRICS = ["count", "wow_diff", "wow_diff_%"]
+
+
+def get_heatmap_matrices(df, days=7):
+    """
+    Pivot the last ``days`` dates of get_heatmap_data output into hour x date matrices.
+    Returns the dates and a dict mapping (platform, metric) to a 24 x ``days`` array,
+    with NaN for hours without data.
+    """
+    dates = pd.Index(df['date'].unique()).sort_values()[-days:]
+    week = df[df['date'] >= dates[0]] if len(dates) else df
+    columns = dates.get_indexer(week['date'])
+    matrices = {}
+    for platform in week['platform'].unique():
+        mask = (week['platform'] == platform).to_numpy()
+        hours, cols = week['hour'].to_numpy()[mask], columns[mask]
+        for metric in HEATMAP_METRICS:
+            matrix = np.full((24, len(dates)), np.nan)
+            matrix[hours, cols] = week[metric].to_numpy(dtype=float)[mask]
+            matrices[platform, metric] = matrix
+    return dates, matrices
+
+
+def get_heatmap_data_streaming(chunks):
+    """
+    Streaming variant of get_heatmap_data for chunks of rows ordered by ``ds``.
+    Only the last count of every (platform, dow, hour) slot is carried between chunks.
+    """
+    last_counts = pd.Series(dtype=float)
+    parts = []
+    for chunk in chunks:
+        filtered_df = _heatmap_columns(chunk)
+        filtered_df['previous'] = filtered_df.groupby(HEATMAP_SLOT)["count"].shift(1)
+
+        # The first row of a slot in this chunk refers to the last one of the previous chunks
+        first = ~filtered_df.duplicated(HEATMAP_SLOT)
+        slots = pd.MultiIndex.from_frame(filtered_df.loc[first, HEATMAP_SLOT])
+        filtered_df.loc[first, 'previous'] = last_counts.reindex(slots).values
+
+        last_counts = filtered_df.groupby(HEATMAP_SLOT)["count"].last().combine_first(last_counts)
+        parts.append(_add_wow_diff(filtered_df))
+    if not parts:
+        return empty_frame(**HEATMAP_SCHEMA)
+    return pd.concat(parts, ignore_index=True)
+
+
+# Query Cube
+# Event counts per (date, hour, platform, query), maintained from vizro.yandex_data.
+# The table and linechart queries read from it instead of scanning raw events, see select_query_cube.
+
+SQL_CREATE_QUERY_CUBE = """
+CREATE TABLE IF NOT EXISTS vizro.yandex_query_cube (
+    date date NOT NULL,
+    hour smallint NOT NULL,
+    platform text NOT NULL,
+    query text NOT NULL,
+    cnt integer NOT NULL,
+    PRIMARY KEY (date, hour, platform, query)
+)
+"""
+
+SQL_UPDATE_QUERY_CUBE = """
+INSERT INTO vizro.yandex_query_cube (date, hour, platform, query, cnt)
+SELECT
+    ts::date AS date,
+    date_part('hour', ts)::smallint AS hour,
+    platform,
+    query,
+    count(*)::int AS cnt
+FROM
+    vizro.yandex_data yd
+WHERE
+    ts >= COALESCE(CAST(:since AS date), '-infinity'::timestamp)
+GROUP BY
+    1, 2, 3, 4
+ON CONFLICT (date, hour, platform, query) DO UPDATE SET cnt = EXCLUDED.cnt
+"""
+
+
+def update_query_cube():
+    """
+    Create the query cube if needed and (re)aggregate events from its last date onward.
+    The last date is recomputed because it may have been only partially loaded.
+    """
+    if DATA_BACKEND == "local":
+        # Local snapshots already contain the cube synced from Postgres
+        return
+    execute(SQL_CREATE_QUERY_CUBE)
+    last_date = select("SELECT max(date) AS last_date FROM vizro.yandex_query_cube", cache=False)['last_date'].iloc[0]
+    # Without a timeout: the first build aggregates all events, which may take longer than
+    # the default statement timeout meant for interactive queries
+    execute(SQL_UPDATE_QUERY_CUBE, params={'since': None if pd.isna(last_date) else str(last_date)}, timeout=0)
+    _query_cube_ready.set()
+
+
+# Until the cube exists and has rows (before its first update, or when the role cannot
+# create it) queries reading it run against the raw events instead
+QUERY_CUBE = "vizro.yandex_query_cube c"
+SQL_RAW_QUERY_CUBE = """(
+    SELECT
+        ts::date AS date,
+        date_part('hour', ts)::smallint AS hour,
+        platform,
+        query,
+        1 AS cnt
+    FROM
+        vizro.yandex_data yd
+    WHERE
+        ts >= :start_date AND ts < :end_date + INTERVAL '1 day'
+) c"""
+QUERY_CUBE_RECHECK = float(os.environ.get("QUERY_CUBE_RECHECK", 60))
+
+_query_cube_ready = threading.Event()
+_query_cube_checked = 0.0
+
+
+def query_cube_ready() -> bool:
+    """
+    Whether vizro.yandex_query_cube exists and has rows. A negative answer is
+    rechecked at most every QUERY_CUBE_RECHECK seconds.
+    """
+    global _query_cube_checked
+    if not _query_cube_ready.is_set() and time.monotonic() - _query_cube_checked >= QUERY_CUBE_RECHECK:
+        _query_cube_checked = time.monotonic()
+        try:
+            if not select("SELECT 1 AS found FROM vizro.yandex_query_cube LIMIT 1", cache=False).empty:
+                _query_cube_ready.set()
+        except Exception as exc:
+            logger.warning("Query cube is not available, reading raw events: %s", exc)
+    return _query_cube_ready.is_set()
+
+
+@functools.lru_cache(maxsize=None)
+def _raw_events_template(template):
+    return QueryTemplate(
+        f"{template.name}_raw", template.sql.replace(QUERY_CUBE, SQL_RAW_QUERY_CUBE), **template.params
+    )
+
+
+def select_query_cube(sql, params):
+    """
+    select() a template reading vizro.yandex_query_cube (with ``start_date`` and ``end_date``
+    parameters), or its equivalent over vizro.yandex_data while the cube is not available.
+    """
+    if QUERY_CUBE in sql.sql and not query_cube_ready():
+        return select(_raw_events_template(sql), params=params, schema=sql.name)
+    return select(sql, params=params)
+
+
 # SQL Queries
 
-SQL_TEMPLATE = """
+SQL_TEMPLATE = QueryTemplate('query_counts', """
 WITH t as (
     SELECT
         query,
         platform,
-        count(*) AS cnt,
-        SUM(count(*)::int) OVER (PARTITION BY query) AS query_total,
-        SUM(count(*)::int) OVER (PARTITION BY platform) AS platform_total
+        SUM(cnt) AS cnt,
+        SUM(SUM(cnt)::int) OVER (PARTITION BY query) AS query_total,
+        SUM(SUM(cnt)::int) OVER (PARTITION BY platform) AS platform_total
     FROM
-        vizro.yandex_data yd
+        vizro.yandex_query_cube c
     WHERE
-        ts BETWEEN '{start_date}' AND '{end_date}'
+        date BETWEEN :start_date AND :end_date
     GROUP BY
         query, platform
 )
@@ -100,20 +458,20 @@ SELECT
     MAX(CASE WHEN platform = 'desktop' THEN platform_total ELSE 0 END) AS desktop_total,
     MAX(CASE WHEN platform = 'touch' THEN platform_total ELSE 0 END) AS touch_total
 FROM t
-WHERE t.query_total >= {min_cnt}
+WHERE t.query_total >= :min_cnt
 GROUP BY query
-"""
+""", start_date='date', end_date='date', min_cnt='int')
 
 
-def proportions_chi2(row: pd.Series) -> float:
+def proportions_chi2(df: pd.DataFrame) -> pd.Series:
     """
-    Calculate the p-value for the Chi-squared test for proportions.
+    Calculate the p-values for the Chi-squared test for proportions for all rows at once.
     """
-    _, pval, _ = proportions_chisquare(
-        count=[row['count_desktop'], row['count_touch']],
-        nobs=[row['desktop_total'], row['touch_total']]
+    _, pval = proportions_chisquare_batch(
+        count=df[['count_desktop', 'count_touch']],
+        nobs=df[['desktop_total', 'touch_total']]
     )
-    return pval
+    return pd.Series(pval, index=df.index)
 
 
 def get_table_data(sql=SQL_TEMPLATE, min_cnt=50, date_range=['2021-09-08', '2021-09-21']) -> pd.DataFrame:
@@ -121,13 +479,13 @@ def get_table_data(sql=SQL_TEMPLATE, min_cnt=50, date_range=['2021-09-08', '2021
     Fetch and prepare data for the summary table, including Chi-squared p-values.
     """
     start_date, end_date = date_range
-    sql = sql.format(start_date=start_date, end_date=end_date, min_cnt=min_cnt)
-    query_df = select(sql)
+    query_df = select_query_cube(sql, sql.bind(start_date=start_date, end_date=end_date, min_cnt=min_cnt))
     query_df['pct_desktop'] = query_df['count_desktop'] / query_df['desktop_total']
     query_df['pct_touch'] = query_df['count_touch'] / query_df['touch_total']
-    query_df["pval"] = query_df.apply(proportions_chi2, axis=1)
+    query_df["pval"] = proportions_chi2(query_df)
 
-    return query_df.rename(columns={
+    # The grid renders the text of the dictionary-encoded queries
+    return decode_queries(query_df).rename(columns={
         "count_desktop": "Count desktop",
         "count_touch": "Count touch",
         "pct_desktop": "Count desktop %",
@@ -136,52 +494,173 @@ def get_table_data(sql=SQL_TEMPLATE, min_cnt=50, date_range=['2021-09-08', '2021
     })
 
 
-def get_butterfly_data(sql=SQL_TEMPLATE, min_cnt=50, date_range=['2021-09-08', '2021-09-21']) -> pd.DataFrame:
+# Only the top ``k`` queries of each platform (among those with at least ``min_cnt`` queries
+# in the range) are returned, with the platform totals over all queries in the range
+SQL_TEMPLATE_TOP_QUERIES = QueryTemplate('query_top', """
+WITH t AS (
+    SELECT
+        query,
+        platform,
+        SUM(cnt) AS cnt
+    FROM
+        vizro.yandex_query_cube c
+    WHERE
+        date BETWEEN :start_date AND :end_date
+    GROUP BY
+        query, platform
+),
+q AS (
+    SELECT
+        query,
+        SUM(CASE WHEN platform = 'desktop' THEN cnt ELSE 0 END)::int AS count_desktop,
+        SUM(CASE WHEN platform = 'touch' THEN cnt ELSE 0 END)::int AS count_touch
+    FROM t
+    GROUP BY query
+    HAVING SUM(cnt) >= :min_cnt
+),
+top AS (
+    (SELECT query FROM q ORDER BY count_desktop DESC, query LIMIT :k)
+    UNION
+    (SELECT query FROM q ORDER BY count_touch DESC, query LIMIT :k)
+),
+totals AS (
+    SELECT
+        SUM(CASE WHEN platform = 'desktop' THEN cnt ELSE 0 END)::int AS desktop_total,
+        SUM(CASE WHEN platform = 'touch' THEN cnt ELSE 0 END)::int AS touch_total
+    FROM t
+)
+SELECT
+    q.query,
+    q.count_desktop,
+    q.count_touch,
+    totals.desktop_total,
+    totals.touch_total
+FROM q
+JOIN top ON top.query = q.query
+CROSS JOIN totals
+ORDER BY q.count_desktop DESC, q.query
+""", start_date='date', end_date='date', min_cnt='int', k='int')
+
+
+def _top_queries(df, column, k) -> pd.Index:
+    """
+    Index of the ``k`` rows of ``df`` with the largest ``column``, ties broken by query text.
+    Only the candidates of a partial selection (keeping ties at the boundary) are sorted.
+    """
+    candidates = df.loc[df[column].nlargest(k, keep='all').index, [column, 'query']]
+    candidates['query'] = candidates['query'].astype(object)
+    return candidates.sort_values([column, 'query'], ascending=[False, True], kind='stable').index[:k]
+
+
+def get_butterfly_data(sql=SQL_TEMPLATE_TOP_QUERIES, min_cnt=50, date_range=['2021-09-08', '2021-09-21'], k=10) -> pd.DataFrame:
     """
     Fetch and prepare data for the butterfly chart by selecting top queries.
+    The top ``k`` queries per platform are selected in SQL when ``sql`` takes a ``k``
+    parameter, otherwise (e.g. for SQL_TEMPLATE) from the full result in pandas.
     """
     start_date, end_date = date_range
-    sql = sql.format(start_date=start_date, end_date=end_date, min_cnt=min_cnt)
-    query_df = select(sql)
-
-    # Select top 10 queries for each platform
-    top_desktop = query_df.sort_values(by="count_desktop", ascending=False).head(10)
-    top_touch = query_df.sort_values(by="count_touch", ascending=False).head(10)
-
-    query_df = pd.concat([top_desktop, top_touch], axis=0).drop_duplicates(subset=['query'])
+    params = dict(start_date=start_date, end_date=end_date, min_cnt=min_cnt)
+    if 'k' in sql.params:
+        params['k'] = k
+    query_df = select_query_cube(sql, sql.bind(**params))
+
+    # Select top k queries for each platform and order them like SQL_TEMPLATE_TOP_QUERIES
+    # (by count descending, ties broken by query text), a no-op on a top-k result
+    top = _top_queries(query_df, 'count_desktop', k).append(_top_queries(query_df, 'count_touch', k)).unique()
+    query_df = query_df.loc[_top_queries(query_df.loc[top], 'count_desktop', len(top))]
     query_df['pct_desktop'] = query_df['count_desktop'] / query_df['desktop_total']
     query_df['pct_touch'] = query_df['count_touch'] / query_df['touch_total']
 
     return query_df
 
 
+# Streaming Query Counts
+
+# The end date is included in full, like the date filter of the cube templates
+SQL_RAW_QUERIES = """
+SELECT query, platform
+FROM vizro.yandex_data yd
+WHERE ts >= :start_date AND ts < :end_date + INTERVAL '1 day'
+"""
+
+RAW_QUERIES_DTYPES = {'query': object, 'platform': 'category'}
+
+
+def reduce_query_counts(chunks, min_cnt=50) -> pd.DataFrame:
+    """
+    Streaming reducer that builds the SQL_TEMPLATE result from chunks of raw
+    (query, platform) rows. Memory is bounded by the number of distinct queries.
+    Queries are counted by their query_dictionary ids and returned dictionary-encoded.
+    """
+    counts = pd.Series(dtype='int64')
+    for chunk in chunks:
+        chunk = chunk.assign(query=query_dictionary.codes(chunk['query']))
+        chunk_counts = chunk.groupby(['query', 'platform'], observed=True).size()
+        counts = counts.add(chunk_counts, fill_value=0) if len(counts) else chunk_counts
+
+    table = (
+        counts.unstack('platform', fill_value=0)
+              .reindex(columns=['desktop', 'touch'], fill_value=0)
+              .astype('int64')
+    ) if len(counts) else pd.DataFrame(columns=['desktop', 'touch'], dtype='int64')
+    totals = table.sum()
+    table = table[table.sum(axis=1) >= min_cnt]
+    return pd.DataFrame({
+        'query': query_dictionary.from_codes(table.index),
+        'count_desktop': table['desktop'].values,
+        'count_touch': table['touch'].values,
+        'desktop_total': totals['desktop'],
+        'touch_total': totals['touch'],
+    })
+
+
+def get_query_counts_streaming(min_cnt=50, date_range=['2021-09-08', '2021-09-21'], chunksize=100_000):
+    """
+    Equivalent of select(SQL_TEMPLATE) that aggregates raw rows client-side in chunks,
+    so peak memory is bounded by ``chunksize`` instead of the size of the date range.
+    """
+    start_date, end_date = (pd.Timestamp(date).date() for date in date_range)
+    chunks = select_iter(
+        SQL_RAW_QUERIES, params={'start_date': start_date, 'end_date': end_date},
+        chunksize=chunksize, dtypes=RAW_QUERIES_DTYPES
+    )
+    return reduce_query_counts(chunks, min_cnt=min_cnt)
+
+
 # Line Chart Query Data
 
-SQL_TEMPLATE_QUERY_LINECHART = """
-WITH t AS (
+# The range is applied once: the cube is aggregated to (platform, hour, query) for the
+# selected dates, and both the hourly top 5 and the returned counts are computed from
+# that aggregate, so the cube is read in a single pass.
+SQL_TEMPLATE_QUERY_LINECHART = QueryTemplate('query_linechart', """
+WITH c AS MATERIALIZED (
     SELECT
+        platform,
+        hour,
         query,
-        date_part('hour', ts) AS hour,
-        COUNT(*) AS cnt,
-        ROW_NUMBER() OVER (PARTITION BY date_part('hour', ts) ORDER BY COUNT(*) DESC) AS rnb
+        SUM(cnt)::int AS cnt
     FROM
-        vizro.yandex_data yd
+        vizro.yandex_query_cube c
     WHERE
-        ts BETWEEN '{start_date}' AND '{end_date}'
-    GROUP BY query, date_part('hour', ts)
+        date BETWEEN :start_date AND :end_date
+    GROUP BY platform, hour, query
+),
+t AS (
+    SELECT
+        query,
+        ROW_NUMBER() OVER (PARTITION BY hour ORDER BY SUM(cnt) DESC, query) AS rnb
+    FROM c
+    GROUP BY query, hour
 )
-SELECT 
-    platform, 
-    date_part('hour', ts) AS hour, 
-    query, 
-    COUNT(*) 
-FROM 
-    vizro.yandex_data yd 
-WHERE 
+SELECT
+    platform,
+    hour,
+    query,
+    cnt AS count
+FROM c
+WHERE
     query IN (SELECT DISTINCT query FROM t WHERE rnb < 6)
-GROUP BY 
-    platform, date_part('hour', ts), query
-"""
+""", start_date='date', end_date='date')
 
 
 def get_query_linechart_data(date_range=['2021-09-08', '2021-09-21']) -> pd.DataFrame:
@@ -189,16 +668,152 @@ def get_query_linechart_data(date_range=['2021-09-08', '2021-09-21']) -> pd.Data
     Fetch and prepare data for query linechart visualization.
     """
     start_date, end_date = date_range
-    sql = SQL_TEMPLATE_QUERY_LINECHART.format(start_date=start_date, end_date=end_date)
-    return select(sql)
+    return select_query_cube(
+        SQL_TEMPLATE_QUERY_LINECHART,
+        SQL_TEMPLATE_QUERY_LINECHART.bind(start_date=start_date, end_date=end_date)
+    )
 
 
 # Data Management
+# Sources below are computed lazily in background threads, see utils.lazy.warm_up
+
+PLATFORMS = ['touch', 'desktop']
+SCALES = ['hours', 'days', 'weeks']
+AGG_SCHEMA = dict(ds='datetime64[ns]', platform=PLATFORM, scale=SCALE, count='int64')
+FORECAST_SCHEMA = dict(
+    ds='datetime64[ns]', y=float, yhat=float, yhat_lower=float, yhat_upper=float,
+    trend=float, weekly=float, daily=float
+)
+HEATMAP_SCHEMA = dict(
+    ds='datetime64[ns]', date=object, platform=PLATFORM, hour='int64', count='int64',
+    wow_diff=float, **{'wow_diff_%': float}
+)
+KPI_SCHEMA = dict(ds='datetime64[ns]', platform=PLATFORM, scale=SCALE, actual='int64', previous=float)
+PIE_SCHEMA = dict(ds='datetime64[ns]', platform=PLATFORM, count='int64', scale=SCALE)
+
+
+
+def _placeholder(schema):
+    """
+    One row per platform and scale, dated today, to build the dashboard before the data is loaded.
+    """
+    rows = pd.MultiIndex.from_product([PLATFORMS, SCALES], names=['platform', 'scale']).to_frame(index=False)
+    today = pd.Timestamp.now().normalize()
+    values = dict(platform=rows['platform'].tolist(), scale=rows['scale'].tolist(),
+                  ds=[today] * len(rows), date=[today.date()] * len(rows))
+    return placeholder_frame(schema, **{column: values[column] for column in values if column in schema})
+
+
+# agg_data partitioned by scale and platform; the agg_data source serves its ds-sorted frame
+agg_store = LazySource(
+    lambda: PartitionedFrame(select("SELECT * FROM vizro.yandex_data_agg", cache=False)), name='agg_store'
+)
+agg_data = LazySource(lambda: agg_store.get().frame, name='agg_data', placeholder=_placeholder(AGG_SCHEMA))
+# All platforms are fitted in one batch, each forecast source picks its own result
+forecasts = LazySource(lambda: make_forecasts(agg_store.get(), freq='h'), name='forecasts')
+forecast_sources = {
+    platform: LazySource(lambda platform=platform: forecasts.get()[platform],
+                         name=f'forecast_{platform}', placeholder=_placeholder(FORECAST_SCHEMA))
+    for platform in PLATFORMS
+}
+# KPIs of all platforms are computed in one pass, each KPI source picks its own frame
+kpis = LazySource(lambda: get_kpi_summaries(agg_store.get()), name='kpis')
+kpi_sources = {
+    platform: LazySource(lambda platform=platform: kpis.get()[platform],
+                         name=f'kpi_{platform}', placeholder=_placeholder(KPI_SCHEMA))
+    for platform in PLATFORMS
+}
+heatmap_data = LazySource(lambda: get_heatmap_data(agg_store.get()),
+                          name='heatmap_data', placeholder=_placeholder(HEATMAP_SCHEMA))
+frame_sources = [
+    agg_data,
+    heatmap_data,
+    *kpi_sources.values(),
+    LazySource(lambda: get_pie_data(agg_store.get()),
+               name='pie_data', placeholder=_placeholder(PIE_SCHEMA)),
+]
+for source in frame_sources:
+    data_manager[source.name] = source
+register_forecasts(forecast_sources)
+lazy_sources = [agg_store, forecasts, kpis, *forecast_sources.values(), *frame_sources]
 
-agg_data = select("SELECT * FROM vizro.yandex_data_agg")
-data_manager['forecast_touch'] = make_forecast(agg_data, freq='h', platform='touch')
-data_manager['forecast_desktop'] = make_forecast(agg_data, freq='h', platform='desktop')
-data_manager['heatmap_data'] = get_heatmap_data(agg_data)
 data_manager["data_table"] = get_table_data
 data_manager['butterfly_data'] = get_butterfly_data
 data_manager['query_linechart_data'] = get_query_linechart_data
+
+
+SQL_AGG_DELTA = """
+SELECT *
+FROM vizro.yandex_data_agg
+WHERE ds >= date_trunc('week', CAST(:since AS timestamp))
+"""
+
+
+def refresh_data():
+    """
+    Incrementally update the lazy sources with rows added to yandex_data_agg.
+
+    Only the current week is re-selected, since its day and week aggregates are still
+    changing. Forecasts are extended with update_forecast instead of being refitted and
+    the heatmap data with update_heatmap_data, KPIs are recomputed in one pass and other
+    derived sources in the background. New events are also added to the query cube.
+    """
+    update_query_cube()
+    agg = agg_store.get()
+    delta = select(SQL_AGG_DELTA, params={'since': agg.frame['ds'].max()}, cache=False)
+    if delta.empty:
+        return
+    agg = agg.update(delta)
+    agg_store.set(agg)
+    agg_data.set(agg.frame)
+
+    current = forecasts.get()
+    forecasts.set({
+        name: update_forecast(agg, forecast, 'h', name) for name, forecast in current.items()
+    })
+    heatmap_data.set(update_heatmap_data(heatmap_data.get(), delta))
+    kpis.set(get_kpi_summaries(agg))
+    for source in [*forecast_sources.values(), *frame_sources]:
+        if source not in (agg_data, heatmap_data):
+            source.reload()
+
+
+def _update_query_cube_safe():
+    try:
+        update_query_cube()
+    except Exception:
+        logger.exception("Query cube update failed")
+
+
+def _refresh_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            refresh_data()
+        except Exception:
+            logger.exception("Incremental data refresh failed")
+
+
+_warm_up_lock = threading.Lock()
+_warmed_up = False
+
+
+def warm_up(refresh_interval=None):
+    """
+    Start computing all lazy data sources in the background once the server starts.
+    With ``refresh_interval`` (seconds, defaults to DATA_REFRESH_INTERVAL) the sources
+    are also refreshed incrementally on that schedule.
+    Only the first call has an effect, so it can also run before every request.
+    """
+    global _warmed_up
+    if _warmed_up:
+        return
+    with _warm_up_lock:
+        if _warmed_up:
+            return
+        _warmed_up = True
+    lazy.warm_up(lazy_sources)
+    threading.Thread(target=_update_query_cube_safe, name="update-query-cube", daemon=True).start()
+    refresh_interval = refresh_interval or float(os.environ.get("DATA_REFRESH_INTERVAL", 0))
+    if refresh_interval:
+        threading.Thread(target=_refresh_loop, args=(refresh_interval,), name="refresh-data", daemon=True).start()
@@ -0,0 +1,107 @@
+import logging
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+
+class QueryDictionary:
+    """
+    Process-wide, append-only dictionary interning query strings to integer ids.
+
+    Encoded columns are pandas categoricals whose categories are the dictionary itself,
+    so every frame shares one id space: sorting, top-N, deduplication and joins on the
+    column work on integer codes, and text is materialized only by ``decode_queries``
+    at the render boundary. Ids never change, so a frame encoded before the dictionary
+    grew can be moved to the current categories with ``recode`` without touching its codes.
+
+    The categories index is named ``name``, which marks encoded columns (see ``owns``):
+    their categories belong to the dictionary, so frame sizes and fingerprints in
+    utils.cache count only their codes.
+
+    Entries are never released, since cached frames may still refer to any id: the
+    dictionary holds every distinct query seen by the process, roughly the text plus
+    about 150 bytes per entry. A warning is logged once it exceeds ``warn_size`` entries;
+    restart the process to reclaim the memory.
+    """
+
+    def __init__(self, name="query_dictionary", warn_size=None):
+        self.name = name
+        self.warn_size = warn_size
+        self._ids = {}
+        self._texts = []
+        self._dtype = pd.CategoricalDtype(pd.Index([], dtype=object, name=name))
+        self._warned = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._texts)
+
+    @property
+    def dtype(self) -> pd.CategoricalDtype:
+        return self._dtype
+
+    def codes(self, values) -> np.ndarray:
+        """
+        Integer ids of ``values`` (-1 for missing values), interning unseen strings.
+        Only the distinct values are looked up in the dictionary.
+        """
+        inverse, uniques = pd.factorize(np.asarray(values, dtype=object))
+        ids = np.empty(len(uniques), dtype=np.int32)
+        with self._lock:
+            for i, text in enumerate(uniques):
+                id_ = self._ids.get(text)
+                if id_ is None:
+                    id_ = self._ids[text] = len(self._texts)
+                    self._texts.append(text)
+                ids[i] = id_
+            if len(self._texts) != len(self._dtype.categories):
+                self._dtype = pd.CategoricalDtype(pd.Index(self._texts, dtype=object, name=self.name))
+                if self.warn_size and len(self._texts) > self.warn_size and not self._warned:
+                    self._warned = True
+                    logger.warning("Query dictionary holds %s entries, which are never released", len(self._texts))
+        return np.where(inverse >= 0, ids[inverse], -1).astype(np.int32)
+
+    def encode(self, values) -> pd.Categorical:
+        """
+        Dictionary-encode ``values`` into a categorical over the shared categories.
+        """
+        codes = self.codes(values)
+        return pd.Categorical.from_codes(codes, dtype=self._dtype)
+
+    def from_codes(self, codes) -> pd.Categorical:
+        """
+        Categorical of ids returned by ``codes``.
+        """
+        return pd.Categorical.from_codes(np.asarray(codes, dtype=np.int32), dtype=self._dtype)
+
+    def recode(self, values) -> pd.Categorical:
+        """
+        Move a categorical encoded with this dictionary to its current categories.
+        """
+        return self.from_codes(pd.Categorical(values).codes)
+
+    def owns(self, dtype) -> bool:
+        """
+        Whether ``dtype`` is the categorical dtype of a column encoded with this dictionary.
+        """
+        return (
+            isinstance(dtype, pd.CategoricalDtype) and dtype.categories is not None
+            and dtype.categories.name == self.name
+        )
+
+
+query_dictionary = QueryDictionary(warn_size=int(os.environ.get("QUERY_DICTIONARY_WARN_SIZE", 1_000_000)))
+
+
+def decode_queries(df, column='query') -> pd.DataFrame:
+    """
+    Replace the dictionary-encoded ``column`` of ``df`` with its text, for rendering.
+    """
+    if column not in df or not isinstance(df[column].dtype, pd.CategoricalDtype):
+        return df
+    return df.assign(**{column: df[column].astype(object)})
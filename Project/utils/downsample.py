@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+
+# Upper bound of points per trace sent to the browser for one chart
+MAX_POINTS = 2000
+
+# Charts with more points than this (over all traces) are drawn with WebGL instead of SVG, 0 disables it
+WEBGL_THRESHOLD = int(os.environ.get("WEBGL_THRESHOLD", 5000))
+
+
+def _bucket_extremes(values, buckets):
+    """
+    Positions of the minimum and maximum value within every bucket (NaN values are ignored).
+    """
+    # Buckets are contiguous and sorted, so after a stable sort by (bucket, value)
+    # the first position of every bucket holds its extreme
+    first = np.r_[True, buckets[1:] != buckets[:-1]]
+    argmin = np.lexsort((np.where(np.isnan(values), np.inf, values), buckets))
+    argmax = np.lexsort((-np.where(np.isnan(values), -np.inf, values), buckets))
+    return np.concatenate([argmin[first], argmax[first]])
+
+
+def minmax_downsample(df: pd.DataFrame, columns, max_points=MAX_POINTS) -> pd.DataFrame:
+    """
+    Reduce ``df`` to about ``max_points`` rows by keeping, in equally sized buckets of
+    consecutive rows, the rows holding the minimum and maximum of each of ``columns``.
+
+    All columns share the selected rows, so traces built from them stay aligned
+    (e.g. the confidence interval fill) and peaks and outliers are preserved.
+    """
+    n = len(df)
+    if n <= max_points:
+        return df
+    n_buckets = max(max_points // (2 * len(columns)), 1)
+    buckets = np.arange(n) * n_buckets // n
+
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    for column in columns:
+        keep[_bucket_extremes(df[column].to_numpy(dtype=float), buckets)] = True
+    return df[keep]
+
+
+def relayout_x_range(relayout_data):
+    """
+    Extract the visible x-axis range from a Graph ``relayoutData`` event.
+    Returns (start, end), None when the axis was reset, or False when the event is not an x-axis change.
+    """
+    if not relayout_data:
+        return False
+    if relayout_data.get("xaxis.autorange"):
+        return None
+    if "xaxis.range[0]" in relayout_data:
+        return pd.Timestamp(relayout_data["xaxis.range[0]"]), pd.Timestamp(relayout_data["xaxis.range[1]"])
+    if "xaxis.range" in relayout_data:
+        start, end = relayout_data["xaxis.range"]
+        return pd.Timestamp(start), pd.Timestamp(end)
+    return False
+
+
+def use_webgl(n_points, threshold=None):
+    """
+    Whether a chart with ``n_points`` points in total should be drawn with WebGL.
+    """
+    threshold = WEBGL_THRESHOLD if threshold is None else threshold
+    return bool(threshold) and n_points > threshold
+
+
+def scatter_trace(n_points, threshold=None):
+    """
+    Scatter trace class for a chart with ``n_points`` points in total: ``go.Scattergl`` above
+    the WebGL threshold, ``go.Scatter`` otherwise. Both take the same hover templates and fills.
+    """
+    return go.Scattergl if use_webgl(n_points, threshold) else go.Scatter
+
+
+def render_mode(n_points, threshold=None):
+    """
+    ``render_mode`` argument of ``px.line``/``px.scatter`` for a chart with ``n_points`` points in total.
+    """
+    return "webgl" if use_webgl(n_points, threshold) else "svg"
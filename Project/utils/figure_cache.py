@@ -0,0 +1,42 @@
+import functools
+import json
+import os
+
+import plotly.graph_objects as go
+
+from utils.cache import LRUCache, frame_fingerprint
+
+
+# Opt-in with FIGURE_CACHE=1; figures are cached as serialized JSON, sized by its length
+FIGURE_CACHE_ENABLED = os.environ.get("FIGURE_CACHE", "0") == "1"
+figure_cache = LRUCache(
+    max_bytes=int(os.environ.get("FIGURE_CACHE_MAX_BYTES", 64 * 2 ** 20)),
+    ttl=float(os.environ.get("FIGURE_CACHE_TTL", 600)),
+)
+
+
+def memoize_figure(func):
+    """
+    Cache the figures returned by a chart function, keyed by a content fingerprint
+    of ``data_frame`` and the other arguments. Use it below ``@capture("graph")``.
+
+    Hits skip the chart code and rebuild the figure from the stored JSON without
+    validation, so every call still gets its own figure that Vizro can modify.
+    """
+
+    @functools.wraps(func)
+    def wrapper(data_frame, *args, **kwargs):
+        if not FIGURE_CACHE_ENABLED:
+            return func(data_frame, *args, **kwargs)
+        key = (func.__qualname__, frame_fingerprint(data_frame), repr(args), repr(sorted(kwargs.items())))
+        fig_json = figure_cache.get_or_load(key, lambda: func(data_frame, *args, **kwargs).to_json())
+        return go.Figure(json.loads(fig_json), _validate=False)
+
+    return wrapper
+
+
+def figure_cache_stats():
+    """
+    Return hit/miss counters of the figure cache.
+    """
+    return figure_cache.stats()
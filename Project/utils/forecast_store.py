@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+import os
+
+import pandas as pd
+import prophet
+from prophet.serialize import model_from_json, model_to_json
+
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(history: pd.DataFrame, params: dict) -> str:
+    """
+    Hash the input series together with the model hyperparameters and Prophet version.
+    Any change to the history or the settings produces a different key.
+    """
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(history, index=False).values.tobytes())
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+    digest.update(prophet.__version__.encode())
+    return digest.hexdigest()[:32]
+
+
+class ForecastStore:
+    """
+    On-disk store of forecasts (Parquet) and fitted Prophet models (JSON) keyed by fingerprint.
+    Only the ``max_entries`` most recently saved entries are kept.
+    """
+
+    def __init__(self, path, max_entries=32):
+        self.path = path
+        self.max_entries = max_entries
+
+    def _file(self, key, ext):
+        return os.path.join(self.path, f"{key}.{ext}")
+
+    def load(self, key):
+        """
+        Return the stored forecast for ``key`` or None if there is none.
+        """
+        try:
+            return pd.read_parquet(self._file(key, "parquet"))
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning("Ignoring unreadable forecast '%s' in %s", key, self.path, exc_info=True)
+            return None
+
+    def load_model(self, key):
+        """
+        Return the stored fitted model for ``key`` or None if there is none.
+        """
+        try:
+            with open(self._file(key, "json")) as fh:
+                return model_from_json(fh.read())
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning("Ignoring unreadable model '%s' in %s", key, self.path, exc_info=True)
+            return None
+
+    def save(self, key, forecast: pd.DataFrame, model):
+        """
+        Store the forecast and the fitted model. Files are written to a temporary name
+        and renamed, so concurrent workers never read a partially written entry.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        tmp_suffix = f".{os.getpid()}.tmp"
+
+        model_file = self._file(key, "json")
+        with open(model_file + tmp_suffix, "w") as fh:
+            fh.write(model_to_json(model))
+        os.replace(model_file + tmp_suffix, model_file)
+
+        # The forecast goes last, its presence marks the entry as complete
+        forecast_file = self._file(key, "parquet")
+        forecast.to_parquet(forecast_file + tmp_suffix, index=False)
+        os.replace(forecast_file + tmp_suffix, forecast_file)
+        self.prune()
+
+    def delete(self, key):
+        """
+        Remove the entry for ``key``, if any.
+        """
+        # The forecast goes first, so a half-deleted entry is never read as complete
+        for ext in ("parquet", "json"):
+            try:
+                os.remove(self._file(key, ext))
+            except FileNotFoundError:
+                pass
+
+    def prune(self):
+        """
+        Delete all but the ``max_entries`` most recently saved entries.
+        """
+        try:
+            entries = [entry for entry in os.scandir(self.path) if entry.name.endswith(".parquet")]
+        except FileNotFoundError:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        for entry in entries[self.max_entries:]:
+            self.delete(entry.name[:-len(".parquet")])
+
+
+forecast_store = ForecastStore(
+    os.environ.get("FORECAST_STORE_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), ".forecast_store")),
+    max_entries=int(os.environ.get("FORECAST_STORE_MAX_ENTRIES", 32)),
+)
@@ -0,0 +1,120 @@
+import json
+import os
+
+import dash_ag_grid as dag
+import pandas as pd
+from vizro.models.types import capture
+from vizro.tables import dash_ag_grid
+
+from utils.cache import LRUCache, frame_nbytes
+
+
+# "infinite" serves the query table block by block from the server, "clientSide" sends all rows with the grid
+TABLE_ROW_MODEL = os.environ.get("TABLE_ROW_MODEL", "infinite")
+TABLE_BLOCK_SIZE = int(os.environ.get("TABLE_BLOCK_SIZE", 100))
+
+# Sorted and filtered views of the grid data, keyed by the data arguments and the grid's models
+grid_views = LRUCache(
+    max_bytes=int(os.environ.get("GRID_CACHE_MAX_BYTES", 64 * 2 ** 20)),
+    ttl=float(os.environ.get("GRID_CACHE_TTL", 600)),
+    sizeof=frame_nbytes,
+)
+
+
+@capture("ag_grid")
+def server_side_grid(data_frame: pd.DataFrame, block_size=TABLE_BLOCK_SIZE, **kwargs) -> dag.AgGrid:
+    """
+    dash_ag_grid with AG Grid's infinite row model.
+
+    The grid is sent without rows; it requests them ``block_size`` rows at a time
+    through ``getRowsRequest``, which a callback answers with ``get_rows``.
+    """
+    props = dash_ag_grid.__wrapped__(data_frame.iloc[:0], **kwargs).to_plotly_json()["props"]
+    props.pop("rowData", None)
+    props["dashGridOptions"] = {**props.get("dashGridOptions", {}), "cacheBlockSize": block_size}
+    return dag.AgGrid(rowModelType="infinite", **props)
+
+
+def _text_mask(values, condition):
+    kind, text = condition.get("type"), str(condition.get("filter") or "").lower()
+    values = values.astype(str).str.lower()
+    if kind == "contains":
+        return values.str.contains(text, regex=False)
+    if kind == "notContains":
+        return ~values.str.contains(text, regex=False)
+    if kind == "equals":
+        return values == text
+    if kind == "notEqual":
+        return values != text
+    if kind == "startsWith":
+        return values.str.startswith(text)
+    if kind == "endsWith":
+        return values.str.endswith(text)
+    raise ValueError(f"Unsupported text filter {kind}")
+
+
+def _number_mask(values, condition):
+    kind, value = condition.get("type"), condition.get("filter")
+    if kind == "equals":
+        return values == value
+    if kind == "notEqual":
+        return values != value
+    if kind == "lessThan":
+        return values < value
+    if kind == "lessThanOrEqual":
+        return values <= value
+    if kind == "greaterThan":
+        return values > value
+    if kind == "greaterThanOrEqual":
+        return values >= value
+    if kind == "inRange":
+        return (values > value) & (values < condition.get("filterTo"))
+    raise ValueError(f"Unsupported number filter {kind}")
+
+
+def _condition_mask(values, condition):
+    if "conditions" in condition:
+        masks = [_condition_mask(values, part) for part in condition["conditions"]]
+        combine = (lambda a, b: a | b) if condition.get("operator") == "OR" else (lambda a, b: a & b)
+        mask = masks[0]
+        for other in masks[1:]:
+            mask = combine(mask, other)
+        return mask
+    if condition.get("type") == "blank":
+        return values.isna()
+    if condition.get("type") == "notBlank":
+        return values.notna()
+    if condition.get("filterType") == "number":
+        return _number_mask(values, condition)
+    return _text_mask(values, condition)
+
+
+def grid_view(df, sort_model=(), filter_model=None) -> pd.DataFrame:
+    """
+    Apply an AG Grid filter model and sort model to ``df``.
+    """
+    for column, condition in (filter_model or {}).items():
+        df = df[_condition_mask(df[column], condition).to_numpy()]
+    if sort_model:
+        df = df.sort_values(
+            by=[item["colId"] for item in sort_model],
+            ascending=[item["sort"] == "asc" for item in sort_model],
+            kind="stable",
+        )
+    return df.reset_index(drop=True)
+
+
+def get_rows(load, request, key) -> dict:
+    """
+    Answer an infinite row model ``getRowsRequest`` with one block of rows.
+
+    ``load`` returns the grid data, identified by the hashable ``key`` (e.g. its data
+    arguments). The sorted and filtered view is cached in ``grid_views``, so paging
+    through it only slices the cached frame.
+    """
+    sort_model = request.get("sortModel") or []
+    filter_model = request.get("filterModel") or {}
+    view_key = (key, json.dumps(sort_model, sort_keys=True), json.dumps(filter_model, sort_keys=True))
+    view = grid_views.get_or_load(view_key, lambda: grid_view(load(), sort_model, filter_model))
+    block = view.iloc[request.get("startRow", 0):request.get("endRow", TABLE_BLOCK_SIZE)]
+    return {"rowData": block.to_dict("records"), "rowCount": len(view)}
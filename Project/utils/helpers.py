@@ -3,7 +3,11 @@ import pandas as pd
 import vizro.models as vm
 from vizro.figures import kpi_card_reference, kpi_card
 import vizro.plotly.express as px
-from utils.data_loader import get_kpi_data, get_pie_data, agg_data, data_manager
+from utils.data_loader import data_manager, get_heatmap_matrices
+from utils.figure_cache import memoize_figure
+from utils.payload import compact_payload
+from utils.dictionary import decode_queries
+from utils.downsample import MAX_POINTS, minmax_downsample, render_mode, scatter_trace
 from vizro.models.types import capture
 from prophet import Prophet
 import plotly.graph_objects as go
@@ -20,7 +24,7 @@ from utils import env_add
 fig_kpi_date = vm.Figure(
     id="kpi-date",
     figure=kpi_card(
-        agg_data,  # Aggregated data
+        'agg_data',  # Aggregated data source
         value_column='ds',  # Value to display
         value_format='{value}',  # Formatting of the value
         agg_func='max',  # Aggregate function (max date)
@@ -33,7 +37,7 @@ fig_kpi_date = vm.Figure(
 fig_kpi_touch = vm.Figure(
     id="kpi-touch",
     figure=kpi_card_reference(
-        get_kpi_data(agg_data, "touch"),  # Get data for touch queries
+        "kpi_touch",  # Data source for touch queries
         value_column="actual",  # Current value
         reference_column="previous",  # Previous value for comparison
         agg_func=lambda x: x.iloc[-1],  # Aggregation function (take last value)
@@ -48,7 +52,7 @@ fig_kpi_touch = vm.Figure(
 fig_kpi_desk = vm.Figure(
     id="kpi-desk",
     figure=kpi_card_reference(
-        get_kpi_data(agg_data, "desktop"),  # Get data for desktop queries
+        "kpi_desktop",  # Data source for desktop queries
         value_column="actual",  # Current value
         reference_column="previous",  # Previous value for comparison
         agg_func=lambda x: x.iloc[-1],  # Aggregation function (take last value)
@@ -62,7 +66,7 @@ fig_kpi_desk = vm.Figure(
 # Pie chart showing the ratio of touch vs. desktop queries
 fig_graph_pie = vm.Graph(
     figure=px.pie(
-        data_frame=get_pie_data(agg_data),  # Get pie chart data
+        data_frame='pie_data',  # Pie chart data source
         values="count",  # Values for pie slices
         names="platform",  # Names of the categories
         title="Queries Ratio Over Selected Date Range",  # Title of the pie chart
@@ -73,77 +77,90 @@ fig_graph_pie = vm.Graph(
 ## Outliers Line Chart: Visualizing Outliers
 
 @capture("graph")
-def outliers_line_plot(data_frame: pd.DataFrame, **kwargs) -> go.Figure:
-    """Creates a line plot to visualize outliers based on prediction confidence intervals."""
+@memoize_figure
+@compact_payload
+def outliers_line_plot(data_frame: pd.DataFrame, max_points=MAX_POINTS, x_range=None, webgl_threshold=None,
+                       **kwargs) -> go.Figure:
+    """Creates a line plot to visualize outliers based on prediction confidence intervals.
+
+    Only the ``x_range`` window (the whole series by default) is plotted, downsampled to
+    at most ``max_points`` points per trace. Above ``webgl_threshold`` points in total
+    (WEBGL_THRESHOLD by default) the traces are drawn with WebGL.
+    """
+    if x_range is not None:
+        data_frame = data_frame[data_frame['ds'].between(*x_range)]
+    data_frame = minmax_downsample(data_frame, ['y', 'yhat', 'yhat_lower', 'yhat_upper', 'trend'], max_points)
+    Scatter = scatter_trace(5 * len(data_frame), webgl_threshold)
     fig = go.Figure()
 
-    # Add actual data trace
-    fig.add_trace(go.Scatter(
+    # Add actual data trace (the day of the week in the hover text is formatted from x)
+    fig.add_trace(Scatter(
         x=data_frame['ds'], y=data_frame['y'], name="Actual", mode='markers',
-        customdata=data_frame['ds'].dt.day_name(),  # Add day of the week as custom data
-        hovertemplate="<b>Date:</b> %{x}<br><b>Actual:</b> %{y}<br><b>DOW:</b> %{customdata}<extra></extra>",
+        hovertemplate="<b>Date:</b> %{x}<br><b>Actual:</b> %{y}<br><b>DOW:</b> %{x|%A}<extra></extra>",
         # Hover template
     ))
 
     # Add prediction data trace
-    fig.add_trace(go.Scatter(
+    fig.add_trace(Scatter(
         x=data_frame['ds'], y=data_frame['yhat'], name="Prediction", mode='lines',
-        customdata=data_frame['ds'].dt.day_name(),
-        hovertemplate="<b>Date:</b> %{x}<br><b>Prediction:</b> %{y:.0f}<br><b>DOW:</b> %{customdata}<extra></extra>",
+        hovertemplate="<b>Date:</b> %{x}<br><b>Prediction:</b> %{y:.0f}<br><b>DOW:</b> %{x|%A}<extra></extra>",
         # Hover template
     ))
 
     # Add 95% confidence interval lower bound
-    fig.add_trace(go.Scatter(
+    fig.add_trace(Scatter(
         x=data_frame['ds'], y=data_frame['yhat_lower'], fill='tonexty', mode='none', name="95% CI Lower",
-        customdata=data_frame['ds'].dt.day_name(),
-        hovertemplate="<b>Date:</b> %{x}<br><b>95% CI Lower:</b> %{y:.0f}<br><b>DOW:</b> %{customdata}<extra></extra>",
+        hovertemplate="<b>Date:</b> %{x}<br><b>95% CI Lower:</b> %{y:.0f}<br><b>DOW:</b> %{x|%A}<extra></extra>",
         # Hover template
     ))
 
     # Add 95% confidence interval upper bound
-    fig.add_trace(go.Scatter(
+    fig.add_trace(Scatter(
         x=data_frame['ds'], y=data_frame['yhat_upper'], fill='tonexty', mode='none', name="95% CI Upper",
-        customdata=data_frame['ds'].dt.day_name(),
-        hovertemplate="<b>Date:</b> %{x}<br><b>95% CI Upper:</b> %{y:.0f}<br><b>DOW:</b> %{customdata}<extra></extra>",
+        hovertemplate="<b>Date:</b> %{x}<br><b>95% CI Upper:</b> %{y:.0f}<br><b>DOW:</b> %{x|%A}<extra></extra>",
         # Hover template
     ))
 
     # Add trend data trace
-    fig.add_trace(go.Scatter(x=data_frame['ds'], y=data_frame['trend'], name="Trend"))
+    fig.add_trace(Scatter(x=data_frame['ds'], y=data_frame['trend'], name="Trend"))
 
     fig.update_layout(
         yaxis=dict(title="Number of Queries"),  # Y-axis title
-        title="Outliers Outside the 95% Confidence Interval"  # Chart title
+        title="Outliers Outside the 95% Confidence Interval",  # Chart title
+        uirevision="outliers"  # Keep the zoom when the figure is re-rendered for a new window
     )
+    if x_range is not None:
+        fig.update_xaxes(range=list(x_range))
     return fig
 
 
 ## Components Plot: Trend and Seasonality
 
 @capture("graph")
-def components_plot(data_frame: pd.DataFrame, **kwargs) -> go.Figure:
-    """Creates subplots for trend and seasonality components."""
+@memoize_figure
+@compact_payload
+def components_plot(data_frame: pd.DataFrame, webgl_threshold=None, **kwargs) -> go.Figure:
+    """Creates subplots for trend and seasonality components, drawn with WebGL above ``webgl_threshold`` points."""
+    Scatter = scatter_trace(len(data_frame) + 168 + 24, webgl_threshold)
     fig = make_subplots(
         rows=3, cols=1,  # Three rows for subplots
         subplot_titles=["Trend", "Weekly Seasonality", "Daily Seasonality"]  # Titles for subplots
     )
 
     # Add trend trace
-    fig.add_trace(go.Scatter(
+    fig.add_trace(Scatter(
         x=data_frame['ds'], y=data_frame['trend'], mode='lines', name='Trend',
         hovertemplate="<b>Date:</b> %{x}<br><b>Trend:</b> %{y:.0f}<extra></extra>",
     ), row=1, col=1)
 
     # Add weekly seasonality trace (last 168 data points)
-    fig.add_trace(go.Scatter(
+    fig.add_trace(Scatter(
         x=data_frame['ds'][-168:], y=data_frame['weekly'][-168:], mode='lines', name='Weekly Trend',
-        customdata=data_frame['ds'].dt.day_name(),
-        hovertemplate="<b>Date:</b> %{x}<br><b>Weekly Trend:</b> %{y:.0f}<br><b>DOW:</b> %{customdata}<extra></extra>",
+        hovertemplate="<b>Date:</b> %{x}<br><b>Weekly Trend:</b> %{y:.0f}<br><b>DOW:</b> %{x|%A}<extra></extra>",
     ), row=2, col=1)
 
     # Add daily seasonality trace (last 24 data points)
-    fig.add_trace(go.Scatter(
+    fig.add_trace(Scatter(
         x=data_frame['ds'][-24:], y=data_frame['daily'][-24:], mode='lines', name='Daily Trend',
         hovertemplate="<b>Time:</b> %{x}<br><b>Daily Trend:</b> %{y:.0f}<extra></extra>",
     ), row=3, col=1)
@@ -155,32 +172,45 @@ def components_plot(data_frame: pd.DataFrame, **kwargs) -> go.Figure:
 # Page Heatmap: Visualizing Query Counts by Date and Hour
 
 @capture("graph")
-def heatmap_plot(data_frame: pd.DataFrame, z, **kwargs) -> go.Figure:
-    """Creates a heatmap to visualize query data by date and hour."""
-    # Filter the data for the last 7 days
-    df = data_frame[data_frame.date > data_frame.date.max() - pd.Timedelta(7, 'days')]
+@memoize_figure
+@compact_payload
+def heatmap_plot(data_frame: pd.DataFrame, z, title=None, **kwargs) -> go.Figure:
+    """Creates a heatmap to visualize query data by date and hour.
+
+    The last 7 days of ``data_frame`` are pivoted into hour x date matrices per platform
+    (see get_heatmap_matrices) and drawn as one go.Heatmap per platform.
+    ``kwargs`` are applied to the figure layout.
+    """
+    dates, matrices = get_heatmap_matrices(data_frame)
+    platforms = [platform for platform in data_frame['platform'].unique() if (platform, z) in matrices]
+    fig = make_subplots(rows=1, cols=max(len(platforms), 1), shared_yaxes=True, horizontal_spacing=0.03,
+                        subplot_titles=[f"platform={platform}" for platform in platforms])
+
+    # Format hover information and text based on the data type (count or percentage)
+    if z == 'wow_diff_%':
+        hovertemplate = '<b>Date: </b>%{x}<br><b>Hour: </b>%{y}<br><b>Queries count: </b>%{z:.2f}%<extra></extra>'
+        texttemplate = '%{z:.2f}%'
+    else:
+        hovertemplate = '<b>Date: </b>%{x}<br><b>Hour: </b>%{y}<br><b>Queries count: </b>%{z}<extra></extra>'
+        texttemplate = '%{z}'
+
+    for col, platform in enumerate(platforms, start=1):
+        fig.add_trace(go.Heatmap(
+            x=pd.to_datetime(dates), y=list(range(24)), z=matrices[platform, z], coloraxis='coloraxis',
+            hovertemplate=hovertemplate, texttemplate=texttemplate, name=platform,
+        ), row=1, col=col)
 
-    # Generate heatmap depending on whether we are visualizing count or percentage difference
+    # Generate the color scale depending on whether we are visualizing count or differences
     if z == 'count':
-        fig = px.density_heatmap(df, x="date", y="hour", z=z, histfunc="sum",  # Heatmap with query count
-                                 text_auto=True, nbinsy=24, nbinsx=7, facet_col="platform",
-                                 color_continuous_scale=px.colors.sequential.Purples,
-                                 **kwargs)
+        fig.update_coloraxes(colorscale=px.colors.sequential.Purples)
     else:
-        fig = px.density_heatmap(df, x="date", y="hour", z=z, histfunc="sum",  # Heatmap with percentage differences
-                                 text_auto=True, nbinsy=24, nbinsx=7, facet_col="platform",
-                                 color_continuous_scale=px.colors.diverging.BrBG, color_continuous_midpoint=0,
-                                 **kwargs)
-
-    # Format hover information based on the data type (count or percentage)
-    for data in fig.data:
-        if z == 'wow_diff_%':
-            data.hovertemplate = '<b>Date: </b>%{x}<br><b>Hour: </b>%{y}<br><b>Queries count: </b>%{z:.2f}%<extra></extra>'
-            data.texttemplate = '%{z:.2f}%'
-            fig.update_coloraxes(colorbar_ticksuffix='%')  # Add percentage sign
-        else:
-            data.hovertemplate = '<b>Date: </b>%{x}<br><b>Hour: </b>%{y}<br><b>Queries count: </b>%{z}<extra></extra>'
+        fig.update_coloraxes(colorscale=px.colors.diverging.BrBG, cmid=0)
+    if z == 'wow_diff_%':
+        fig.update_coloraxes(colorbar_ticksuffix='%')  # Add percentage sign
 
+    fig.update_xaxes(title_text='date')
+    fig.update_yaxes(title_text='hour', col=1)
+    fig.update_layout(title=title, **kwargs)
     fig.update_coloraxes(colorbar_title_text='')  # Update colorbar title
     return fig
 
@@ -188,8 +218,11 @@ def heatmap_plot(data_frame: pd.DataFrame, z, **kwargs) -> go.Figure:
 ## Butterfly Plot: Comparing Desktop vs. Touch Queries
 
 @capture("graph")
+@memoize_figure
+@compact_payload
 def butterfly(data_frame: pd.DataFrame, **kwargs) -> go.Figure:
     """Creates a butterfly chart comparing desktop vs. touch queries."""
+    data_frame = decode_queries(data_frame)
     fig = px.bar(data_frame.iloc[::-1], color_discrete_sequence=px.colors.qualitative.D3[1::-1], **kwargs)
 
     # Reverse axis orientation for mirrored chart
@@ -228,8 +261,12 @@ def butterfly(data_frame: pd.DataFrame, **kwargs) -> go.Figure:
 ## Line Chart for Queries by Hour
 
 @capture("graph")
-def linechart_query_plot(data_frame: pd.DataFrame, **kwargs) -> go.Figure:
-    """Creates a line chart showing queries by hour for each platform."""
+@memoize_figure
+@compact_payload
+def linechart_query_plot(data_frame: pd.DataFrame, webgl_threshold=None, **kwargs) -> go.Figure:
+    """Creates a line chart showing queries by hour for each platform, drawn with WebGL above ``webgl_threshold`` points."""
+    kwargs.setdefault('render_mode', render_mode(len(data_frame), webgl_threshold))
+    data_frame = decode_queries(data_frame)
     fig = px.line(
         data_frame,
         x='hour',  # Hour of the day
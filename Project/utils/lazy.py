@@ -0,0 +1,138 @@
+import logging
+import threading
+
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+# Set once the dashboard is built and the server is about to start serving requests
+_serving = threading.Event()
+
+
+class LazySource:
+    """
+    Data source that is computed once, in a background thread, on first use.
+
+    Instances are callables and can be registered directly in ``data_manager``.
+    Before the server starts (i.e. while the dashboard is being built) a call
+    returns ``placeholder`` without starting the computation, so building pages
+    never waits for or queries the database; only ``warm_up`` starts it. This also
+    keeps worker processes that import the app module (e.g. the forecasting pool)
+    from loading anything. Afterwards a call waits for the data, which keeps the
+    component in its loading state until it is ready.
+    """
+
+    def __init__(self, load, name, placeholder=None):
+        self.name = name
+        self.placeholder = placeholder
+        self._load = load
+        self._value = None
+        self._error = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set() and self._error is None
+
+    def start(self):
+        """
+        Start computing the data in the background, unless it is already computed or
+        in progress. A previously failed computation is retried.
+        """
+        with self._lock:
+            if self.ready or (self._thread is not None and not self._ready.is_set()):
+                return
+            self._ready.clear()
+            self._error = None
+            self._thread = threading.Thread(target=self._run, name=f"load-{self.name}", daemon=True)
+            self._thread.start()
+
+    def get(self) -> pd.DataFrame:
+        """
+        Return the computed data, waiting for it if necessary.
+        """
+        self.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+    def set(self, value):
+        """
+        Replace the data, e.g. after an incremental refresh.
+        """
+        with self._lock:
+            self._value = value
+            self._error = None
+            self._ready.set()
+
+    def reload(self):
+        """
+        Recompute the data in the background, serving the previous value until it is replaced.
+        """
+        if not self.ready:
+            self.start()
+            return
+        threading.Thread(target=self._reload, name=f"reload-{self.name}", daemon=True).start()
+
+    def __call__(self) -> pd.DataFrame:
+        # Shallow copies: copy-on-write keeps the stored frame intact when a caller modifies
+        # the result, so copying the data on every render would only cost O(table)
+        if not self._ready.is_set() and self.placeholder is not None and not _serving.is_set():
+            return self.placeholder.copy(deep=False)
+        return self.get().copy(deep=False)
+
+    def _run(self):
+        try:
+            self._value = self._load()
+            logger.info("Data source '%s' is ready", self.name)
+        except Exception as exc:
+            logger.exception("Failed to load data source '%s'", self.name)
+            self._error = exc
+        finally:
+            self._ready.set()
+
+    def _reload(self):
+        try:
+            self.set(self._load())
+            logger.info("Data source '%s' is reloaded", self.name)
+        except Exception:
+            logger.exception("Failed to reload data source '%s', keeping the previous data", self.name)
+
+
+def warm_up(sources):
+    """
+    Mark the app as serving and start computing all ``sources`` in the background.
+    """
+    _serving.set()
+    for source in sources:
+        source.start()
+
+
+def empty_frame(**dtypes) -> pd.DataFrame:
+    """
+    Build an empty DataFrame with the given column dtypes, used as a placeholder.
+    """
+    return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in dtypes.items()})
+
+
+def placeholder_frame(dtypes, **values) -> pd.DataFrame:
+    """
+    Build a placeholder DataFrame with the given column dtypes. Columns in ``values``
+    take those values, other numeric columns are zero and the rest are missing.
+    Filters need non-empty columns to be built, so placeholders should have rows.
+    """
+    n_rows = len(next(iter(values.values()))) if values else 0
+    columns = {}
+    for column, dtype in dtypes.items():
+        if column in values:
+            data = values[column]
+        elif pd.api.types.is_numeric_dtype(pd.Series(dtype=dtype)):
+            data = [0] * n_rows
+        else:
+            data = [None] * n_rows
+        columns[column] = pd.Series(data, dtype=dtype)
+    return pd.DataFrame(columns)
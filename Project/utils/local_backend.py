@@ -0,0 +1,99 @@
+import logging
+import os
+import threading
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.queries import BIND_PARAM
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocalBackend:
+    """
+    In-process query backend over local Parquet snapshots of the Postgres tables.
+
+    Each snapshot ``<schema>.<table>.parquet`` is exposed to an embedded DuckDB
+    database as a view with the same qualified name, so the existing SQL
+    templates run unchanged and without network access.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._con = None
+        self._views = set()
+        self._lock = threading.Lock()
+
+    def _file(self, table):
+        return os.path.join(self.path, f"{table}.parquet")
+
+    def _cursor(self):
+        with self._lock:
+            if self._con is None:
+                self._con = duckdb.connect()
+            for name in os.listdir(self.path) if os.path.isdir(self.path) else []:
+                table = name[:-len(".parquet")]
+                if name.endswith(".parquet") and table not in self._views:
+                    schema = table.split(".")[0] if "." in table else "main"
+                    self._con.execute(f'CREATE SCHEMA IF NOT EXISTS "{schema}"')
+                    path = self._file(table).replace("'", "''")
+                    self._con.execute(f"CREATE OR REPLACE VIEW {table} AS SELECT * FROM read_parquet('{path}')")
+                    self._views.add(table)
+            # Cursors are independent connections to the same database, one per query/thread
+            return self._con.cursor()
+
+    def _execute(self, sql, params=None):
+        cursor = self._cursor()
+        return cursor, cursor.execute(BIND_PARAM.sub(r"$\1", sql), params or {})
+
+    def read_sql(self, sql, params=None) -> pd.DataFrame:
+        """
+        Run a query against the local snapshots and return the result as a DataFrame.
+        """
+        cursor, result = self._execute(sql, params)
+        try:
+            return result.df()
+        finally:
+            cursor.close()
+
+    def read_sql_iter(self, sql, params=None, chunksize=50_000):
+        """
+        Run a query against the local snapshots and yield the result in chunks.
+        """
+        cursor, result = self._execute(sql, params)
+        try:
+            for batch in result.fetch_record_batch(chunksize):
+                yield batch.to_pandas()
+        finally:
+            cursor.close()
+
+    def write_table(self, table, chunks):
+        """
+        Write the DataFrame ``chunks`` of ``table`` to its Parquet snapshot.
+        The snapshot is replaced atomically once all chunks are written.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        target = self._file(table)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        writer = None
+        rows = 0
+        try:
+            for chunk in chunks:
+                batch = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(tmp, batch.schema)
+                writer.write_table(batch.cast(writer.schema))
+                rows += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+        if writer is None:
+            logger.warning("Table %s is empty, keeping the previous snapshot", table)
+            return 0
+        os.replace(tmp, target)
+        logger.info("Synced %s rows of %s to %s", rows, table, target)
+        return rows
@@ -0,0 +1,81 @@
+import pandas as pd
+
+
+class PartitionedFrame:
+    """
+    DataFrame split into partitions per value of the ``keys`` columns, each sorted by ``sort_by``.
+
+    The frame is sorted by ``keys`` and ``sort_by`` once, so every partition is a contiguous
+    slice of it. ``partition`` and ``select`` return these slices without copying (pandas
+    copy-on-write keeps the store intact when a caller modifies them), so selecting by the
+    keys costs O(partition) instead of a scan of the whole frame.
+    """
+
+    def __init__(self, df, keys=("scale", "platform"), sort_by="ds"):
+        self.keys = list(keys)
+        self.sort_by = sort_by
+        self.frame = df.sort_values([*self.keys, sort_by], ignore_index=True)
+        self._partitions = {}
+        for key, positions in self.frame.groupby(self.keys, sort=False, dropna=False).indices.items():
+            self._partitions[key] = self.frame.iloc[positions[0]:positions[-1] + 1]
+
+    @classmethod
+    def _from_pieces(cls, pieces, keys, sort_by):
+        # ``pieces`` maps each key, in order, to the sorted frames making up its partition
+        store = cls.__new__(cls)
+        store.keys = list(keys)
+        store.sort_by = sort_by
+        store.frame = pd.concat([piece for frames in pieces.values() for piece in frames], ignore_index=True)
+        store._partitions = {}
+        start = 0
+        for key, frames in pieces.items():
+            end = start + sum(len(piece) for piece in frames)
+            store._partitions[key] = store.frame.iloc[start:end]
+            start = end
+        return store
+
+    def partition(self, *key) -> pd.DataFrame:
+        """
+        Rows of one partition, e.g. ``partition('hours', 'touch')``.
+        """
+        part = self._partitions.get(key)
+        return self.frame.iloc[:0] if part is None else part
+
+    def select(self, **values) -> pd.DataFrame:
+        """
+        Rows whose key columns equal ``values``, e.g. ``select(scale='hours')``.
+        A single matching partition is returned as is, several are concatenated in key order.
+        """
+        unknown = set(values) - set(self.keys)
+        if unknown:
+            raise KeyError(f"Not partitioned by {sorted(unknown)}")
+        positions = [self.keys.index(column) for column in values]
+        parts = [
+            part for key, part in self._partitions.items()
+            if all(key[i] == value for i, value in zip(positions, values.values()))
+        ]
+        if not parts:
+            return self.frame.iloc[:0]
+        return parts[0] if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+
+    def update(self, delta) -> "PartitionedFrame":
+        """
+        Return a new PartitionedFrame where the rows from the first ``sort_by`` value of
+        ``delta`` on are replaced with the rows of ``delta``.
+        Partitions are cut by binary search and concatenated once, the frame is not re-sorted.
+        """
+        if delta.empty:
+            return self
+        since = delta[self.sort_by].min()
+        new = PartitionedFrame(delta, self.keys, self.sort_by)
+        pieces = {}
+        for key in sorted(set(self._partitions) | set(new._partitions)):
+            old = self.partition(*key)
+            pieces[key] = [old.iloc[:old[self.sort_by].searchsorted(since)], new.partition(*key)]
+        return PartitionedFrame._from_pieces(pieces, self.keys, self.sort_by)
+
+    def __len__(self):
+        return len(self.frame)
+
+    def __repr__(self):
+        return f"PartitionedFrame({len(self.frame)} rows, {len(self._partitions)} partitions by {self.keys})"
@@ -0,0 +1,87 @@
+import functools
+import logging
+import os
+import threading
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+# Compaction is on by default, COMPACT_FIGURES=0 sends the figures as built
+COMPACT_FIGURES = os.environ.get("COMPACT_FIGURES", "1") != "0"
+
+# Opt-in with FIGURE_PAYLOAD_STATS=1; measuring serializes every figure once more
+PAYLOAD_STATS_ENABLED = os.environ.get("FIGURE_PAYLOAD_STATS", "0") == "1"
+
+# Trace attributes holding per-point data
+ARRAY_ATTRIBUTES = ("x", "y", "z", "customdata", "base", "text")
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _axis_name(trace, axis):
+    # Trace axis references are "x", "x2", ...; the layout keys are "xaxis", "xaxis2", ...
+    ref = getattr(trace, f"{axis}axis", None) or axis
+    return f"{axis}axis{ref[1:]}"
+
+
+def compact_figure(fig):
+    """
+    Shrink the serialized size of ``fig`` in place and return it.
+
+    Plotly sends numpy arrays as base64 typed arrays, so only their encoding has to be chosen:
+    float arrays are sent as float32 and datetime x/y arrays of scatter traces as epoch
+    milliseconds on an explicit date axis instead of ISO strings.
+    """
+    for trace in fig.data:
+        for attribute in ARRAY_ATTRIBUTES:
+            values = getattr(trace, attribute, None)
+            if not isinstance(values, np.ndarray):
+                continue
+            if values.dtype == np.float64:
+                trace[attribute] = values.astype(np.float32)
+            elif (np.issubdtype(values.dtype, np.datetime64) and attribute in ("x", "y")
+                  and trace.type in ("scatter", "scattergl")):
+                trace[attribute] = values.astype("datetime64[ms]").astype(np.int64).astype(np.float64)
+                fig.layout[_axis_name(trace, attribute)].type = "date"
+    return fig
+
+
+def compact_payload(func):
+    """
+    Apply ``compact_figure`` to the figures returned by a chart function.
+    Use it below ``@capture("graph")`` and ``@memoize_figure``, so cached figures are already compact.
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        fig = func(*args, **kwargs)
+        if not PAYLOAD_STATS_ENABLED:
+            return compact_figure(fig) if COMPACT_FIGURES else fig
+        raw_bytes = len(fig.to_json())
+        if COMPACT_FIGURES:
+            compact_figure(fig)
+        _record(func.__qualname__, raw_bytes, len(fig.to_json()))
+        return fig
+
+    return wrapper
+
+
+def _record(name, raw_bytes, sent_bytes):
+    with _stats_lock:
+        stats = _stats.setdefault(name, {"figures": 0, "raw_bytes": 0, "sent_bytes": 0, "max_bytes": 0})
+        stats["figures"] += 1
+        stats["raw_bytes"] = raw_bytes
+        stats["sent_bytes"] = sent_bytes
+        stats["max_bytes"] = max(stats["max_bytes"], sent_bytes)
+    logger.info("Figure %s: %s bytes (%s bytes before compaction)", name, sent_bytes, raw_bytes)
+
+
+def payload_stats():
+    """
+    Return the serialized size of the last figure of every chart function, before and after compaction.
+    """
+    with _stats_lock:
+        return {name: dict(stats) for name, stats in _stats.items()}
@@ -0,0 +1,92 @@
+import re
+import threading
+
+import pandas as pd
+
+
+# SQLAlchemy style :name bind parameters, skipping Postgres ::type casts
+BIND_PARAM = re.compile(r"(?<![:\w]):(\w+)")
+
+# Converters from user input (e.g. DatePicker strings) to the declared SQL types
+_PARAM_CASTS = {
+    "date": lambda value: pd.Timestamp(value).date(),
+    "timestamp": lambda value: pd.Timestamp(value).to_pydatetime(),
+    "int": int,
+    "bigint": int,
+    "float8": float,
+    "text": str,
+}
+
+
+class QueryTemplate:
+    """
+    Named SQL statement with typed bind parameters.
+
+    ``sql`` refers to parameters as ``:name`` and ``params`` maps each name to its SQL
+    type. On Postgres the statement is prepared once per connection and executed with
+    EXECUTE, so the server can reuse its plan; see utils.supabase.select.
+    """
+
+    def __init__(self, name, sql, **params):
+        self.name = name
+        self.sql = sql
+        self.params = params
+        missing = set(BIND_PARAM.findall(sql)) - set(params)
+        if missing:
+            raise ValueError(f"Query template {name} has undeclared parameters: {sorted(missing)}")
+        self.stats = TemplateStats()
+
+    def bind(self, **values) -> dict:
+        """
+        Validate and convert parameter values to their declared types.
+        """
+        if set(values) != set(self.params):
+            raise ValueError(f"Query template {self.name} expects parameters {sorted(self.params)}, got {sorted(values)}")
+        return {name: _PARAM_CASTS[self.params[name]](value) for name, value in values.items()}
+
+    def prepare_sql(self) -> str:
+        """
+        PREPARE statement with positional parameters in declaration order.
+        """
+        positions = {name: i for i, name in enumerate(self.params, start=1)}
+        body = BIND_PARAM.sub(lambda m: f"${positions[m.group(1)]}", self.sql)
+        return f"PREPARE {self.name} ({', '.join(self.params.values())}) AS {body}"
+
+    def execute_sql(self) -> str:
+        """
+        EXECUTE statement of the prepared template, taking the same :name parameters.
+        """
+        return f"EXECUTE {self.name} ({', '.join(f':{name}' for name in self.params)})"
+
+    def __repr__(self):
+        return f"QueryTemplate({self.name!r})"
+
+
+class TemplateStats:
+    """
+    Execution counters and latency of one query template.
+    """
+
+    def __init__(self):
+        self.executions = 0
+        self.prepares = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.plan = None
+        self._lock = threading.Lock()
+
+    def record(self, elapsed_ms, prepared=False):
+        with self._lock:
+            self.executions += 1
+            self.prepares += int(prepared)
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "executions": self.executions,
+                "prepares": self.prepares,
+                "avg_ms": self.total_ms / self.executions if self.executions else 0.0,
+                "max_ms": self.max_ms,
+            }
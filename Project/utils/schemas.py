@@ -0,0 +1,85 @@
+import logging
+import re
+
+import pandas as pd
+
+from utils.cache import frame_nbytes
+from utils.dictionary import query_dictionary
+
+
+logger = logging.getLogger(__name__)
+
+# Low-cardinality text columns with a fixed set of values
+PLATFORM = pd.CategoricalDtype(['desktop', 'touch'])
+SCALE = pd.CategoricalDtype(['days', 'hours', 'weeks'])
+
+# Integer counts, downcast to the smallest integer type holding their values
+COUNT = "count"
+
+# Free-text query strings, dictionary-encoded with utils.dictionary.query_dictionary
+QUERY = "query"
+
+# Column dtypes per table (for plain SQL) and per query template name; columns not
+# listed, or not present in a result, are left as loaded
+SCHEMAS = {
+    "vizro.yandex_data": dict(platform=PLATFORM),
+    "vizro.yandex_data_agg": dict(platform=PLATFORM, scale=SCALE, count=COUNT),
+    "vizro.yandex_query_cube": dict(hour='int8', platform=PLATFORM, query=QUERY, cnt=COUNT),
+    "query_counts": dict(
+        query=QUERY, count_desktop=COUNT, count_touch=COUNT, desktop_total=COUNT, touch_total=COUNT
+    ),
+    "query_top": dict(
+        query=QUERY, count_desktop=COUNT, count_touch=COUNT, desktop_total=COUNT, touch_total=COUNT
+    ),
+    "query_linechart": dict(platform=PLATFORM, hour='int8', query=QUERY, count=COUNT),
+    "forecast": dict(
+        y='float32', yhat='float32', yhat_lower='float32', yhat_upper='float32',
+        trend='float32', weekly='float32', daily='float32',
+    ),
+}
+
+# First table a plain SQL statement reads from
+FROM_TABLE = re.compile(r"\bFROM\s+([\w.]+)", re.IGNORECASE)
+
+
+def schema_name(sql):
+    """
+    Registry key of a query: the template name of a QueryTemplate, otherwise the
+    first table in its FROM clause.
+    """
+    name = getattr(sql, "name", None)
+    if name is None:
+        match = FROM_TABLE.search(sql)
+        name = match.group(1) if match else None
+    return name if name in SCHEMAS else None
+
+
+def _cast(series, dtype):
+    if isinstance(dtype, str) and dtype == COUNT:
+        return pd.to_numeric(series, downcast='integer') if pd.api.types.is_integer_dtype(series) else series
+    if isinstance(dtype, str) and dtype == QUERY:
+        return pd.Series(query_dictionary.encode(series), index=series.index, name=series.name)
+    if isinstance(dtype, pd.CategoricalDtype) and dtype.categories is not None:
+        unknown = series.notna() & ~series.isin(dtype.categories)
+        if unknown.any():
+            logger.warning("Column %s has values outside %s, keeping its own categories",
+                           series.name, list(dtype.categories))
+            return series.astype('category')
+    return series.astype(dtype)
+
+
+def apply_schema(df, name) -> pd.DataFrame:
+    """
+    Cast the columns of ``df`` to the registered schema ``name`` and log the memory
+    usage before and after. Returns ``df`` unchanged when ``name`` is not registered.
+    """
+    schema = SCHEMAS.get(name)
+    if not schema:
+        return df
+    measure = logger.isEnabledFor(logging.INFO)
+    before = frame_nbytes(df) if measure else 0
+    df = df.assign(**{column: _cast(df[column], dtype) for column, dtype in schema.items() if column in df})
+    if measure:
+        after = frame_nbytes(df)
+        logger.info("Schema %s: %s rows, %.2f MiB -> %.2f MiB", name, len(df), before / 2 ** 20, after / 2 ** 20)
+    return df
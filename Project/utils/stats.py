@@ -0,0 +1,26 @@
+import numpy as np
+from scipy import stats
+
+
+def proportions_chisquare_batch(count, nobs):
+    """
+    Vectorized equivalent of statsmodels' proportions_chisquare for many 2-sample tests.
+
+    ``count`` and ``nobs`` are (n, 2) array-likes holding successes and totals of both
+    samples for each of the n tests. Returns arrays of chi-squared statistics and p-values.
+    """
+    count = np.asarray(count, dtype=float)
+    nobs = np.asarray(nobs, dtype=float)
+
+    # (n, 2 samples, 2 outcomes) contingency tables and their expected frequencies
+    table = np.stack([count, nobs - count], axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        expected = (
+            table.sum(axis=1, keepdims=True) * table.sum(axis=2, keepdims=True)
+            / table.sum(axis=(1, 2), keepdims=True)
+        )
+        chi2stat = ((table - expected) ** 2 / expected).sum(axis=(1, 2))
+
+    # One degree of freedom for a 2x2 table
+    pval = stats.chi2.sf(chi2stat, 1)
+    return chi2stat, pval
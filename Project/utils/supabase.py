@@ -1,13 +1,295 @@
+import logging
 import os
+import threading
+import time
 from sqlalchemy import text
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 import pandas as pd
 from utils import env_add
+from utils.cache import QueryCache
+from utils.local_backend import LocalBackend
+from utils.queries import QueryTemplate
+from utils.schemas import apply_schema, schema_name
 
 
-engine = create_engine(os.environ.get("supabase"), client_encoding='utf8', )
+logger = logging.getLogger(__name__)
 
-def select(sql):
-    sql = text(sql)
-    return pd.read_sql(sql, engine)
 
+class PoolMetrics:
+    """
+    Connection usage counters collected from SQLAlchemy pool events.
+    """
+
+    def __init__(self):
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self._lock = threading.Lock()
+
+    def attach(self, engine):
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+            self.in_use = max(self.in_use - 1, 0)
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "wait_avg": self.wait_total / self.checkouts if self.checkouts else 0.0,
+                "wait_max": self.wait_max,
+            }
+
+
+def make_engine(
+    url, pool_size=5, max_overflow=10, pool_recycle=1800, pool_timeout=30, pool_pre_ping=True, statement_timeout=0
+):
+    """
+    Create an engine with a sized connection pool. SQLite URLs (used as a local
+    stand-in) keep SQLAlchemy's default SQLite pool.
+    ``statement_timeout`` (seconds, 0 disables it) is set once per connection at connect time.
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return create_engine(url, pool_pre_ping=pool_pre_ping)
+    connect_args = {}
+    if statement_timeout:
+        connect_args["options"] = f"-c statement_timeout={int(statement_timeout * 1000)}"
+    return create_engine(
+        url,
+        client_encoding='utf8',
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_recycle=pool_recycle,
+        pool_timeout=pool_timeout,
+        pool_pre_ping=pool_pre_ping,
+        connect_args=connect_args,
+    )
+
+
+# "postgres" queries Supabase, "local" queries Parquet snapshots in-process (see sync_local_snapshot)
+DATA_BACKEND = os.environ.get("DATA_BACKEND", "postgres")
+SNAPSHOT_TABLES = ["vizro.yandex_data", "vizro.yandex_data_agg", "vizro.yandex_query_cube"]
+
+# Default per-query statement timeout in seconds, 0 disables it
+STATEMENT_TIMEOUT = float(os.environ.get("DB_STATEMENT_TIMEOUT", 60))
+
+# The remote database is optional when running fully offline on the local backend
+engine = make_engine(
+    os.environ.get("supabase"),
+    pool_size=int(os.environ.get("DB_POOL_SIZE", 5)),
+    max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", 10)),
+    pool_recycle=int(os.environ.get("DB_POOL_RECYCLE", 1800)),
+    pool_timeout=float(os.environ.get("DB_POOL_TIMEOUT", 30)),
+    statement_timeout=STATEMENT_TIMEOUT,
+) if os.environ.get("supabase") else None
+pool_metrics = PoolMetrics()
+if engine is not None:
+    pool_metrics.attach(engine)
+
+local_backend = LocalBackend(
+    os.environ.get("LOCAL_DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), ".local_data"))
+)
+
+# Supabase's transaction-mode pooler listens on this port and cannot keep prepared statements
+TRANSACTION_POOLER_PORT = 6543
+
+# Server-side prepared statements for query templates, by default on unless connected
+# through the transaction-mode pooler; DB_PREPARED_STATEMENTS=0/1 overrides the detection
+PREPARED_STATEMENTS = os.environ.get(
+    "DB_PREPARED_STATEMENTS", "0" if engine is not None and engine.url.port == TRANSACTION_POOLER_PORT else "1"
+) != "0"
+
+# Query results shared between loaders, sized by bytes and expired after a TTL
+query_cache = QueryCache(
+    max_bytes=int(os.environ.get("QUERY_CACHE_MAX_BYTES", 256 * 2 ** 20)),
+    ttl=float(os.environ.get("QUERY_CACHE_TTL", 600)),
+)
+
+
+def _connect():
+    started = time.perf_counter()
+    conn = engine.connect()
+    pool_metrics.record_wait(time.perf_counter() - started)
+    return conn
+
+
+def _set_statement_timeout(conn, timeout):
+    # The default is set on every connection by make_engine, only overrides need a round trip
+    if timeout is None or timeout == STATEMENT_TIMEOUT:
+        return
+    if conn.dialect.name == "postgresql":
+        # Local to the transaction, so the pooled connection is not affected afterwards
+        conn.execute(
+            text("SELECT set_config('statement_timeout', :timeout, true)"),
+            {"timeout": str(int(timeout * 1000))},
+        )
+
+
+def _read_sql(sql, params=None, timeout=None):
+    if isinstance(sql, QueryTemplate):
+        return _read_template(sql, params, timeout)
+    if DATA_BACKEND == "local":
+        return local_backend.read_sql(sql, params)
+    with _connect() as conn:
+        _set_statement_timeout(conn, timeout)
+        return pd.read_sql(text(sql), conn, params=params)
+
+
+def _read_template(template, params, timeout=None):
+    started = time.perf_counter()
+    prepared = False
+    if DATA_BACKEND == "local":
+        df = local_backend.read_sql(template.sql, params)
+    else:
+        with _connect() as conn:
+            _set_statement_timeout(conn, timeout)
+            if PREPARED_STATEMENTS and conn.dialect.name == "postgresql":
+                # Prepared statements live as long as the pooled DBAPI connection
+                statements = conn.connection.info.setdefault("prepared_statements", set())
+                if template.name not in statements:
+                    conn.exec_driver_sql(template.prepare_sql())
+                    statements.add(template.name)
+                    prepared = True
+                if template.stats.plan is None:
+                    plan = conn.execute(text(f"EXPLAIN {template.execute_sql()}"), params)
+                    template.stats.plan = "\n".join(row[0] for row in plan)
+                    logger.info("Plan of query %s:\n%s", template.name, template.stats.plan)
+                df = pd.read_sql(text(template.execute_sql()), conn, params=params)
+            else:
+                df = pd.read_sql(text(template.sql), conn, params=params)
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    template.stats.record(elapsed_ms, prepared=prepared)
+    stats = template.stats.snapshot()
+    logger.info(
+        "Query %s: %.1f ms, %s rows (prepared on this connection: %s, executions: %s, avg: %.1f ms, max: %.1f ms)",
+        template.name, elapsed_ms, len(df), prepared, stats["executions"], stats["avg_ms"], stats["max_ms"],
+    )
+    return df
+
+
+def select(sql, params=None, cache=True, timeout=None, schema=None):
+    """
+    Run a query and return the result as a DataFrame.
+    ``sql`` is either SQL text or a QueryTemplate, whose ``params`` should come from
+    QueryTemplate.bind and which runs as a server-side prepared statement on Postgres
+    (see PREPARED_STATEMENTS).
+    Results are memoized in ``query_cache`` unless ``cache`` is False.
+    ``timeout`` overrides the default statement timeout (seconds).
+    Columns are cast to the registered ``schema`` (see utils.schemas), by default the one
+    of the template or of the first table the query reads from.
+    """
+    schema = schema or schema_name(sql)
+
+    def load():
+        return apply_schema(_read_sql(sql, params, timeout), schema)
+
+    if not cache:
+        return load()
+    sql_text = sql.sql if isinstance(sql, QueryTemplate) else sql
+    return query_cache.get_or_load(sql_text, params, load)
+
+
+def execute(sql, params=None, timeout=None):
+    """
+    Run a data-modifying statement in its own transaction on Postgres.
+    Cached query results are dropped since they may be stale afterwards.
+    """
+    with _connect() as conn, conn.begin():
+        _set_statement_timeout(conn, timeout)
+        conn.execute(text(sql), params or {})
+    query_cache.clear()
+
+
+def select_iter(sql, params=None, chunksize=50_000, dtypes=None, timeout=None):
+    """
+    Run a query and yield the result as DataFrame chunks of at most ``chunksize`` rows.
+    Rows are fetched through a server-side cursor, so only one chunk is held in memory.
+    ``dtypes`` maps column names to the dtypes every chunk is cast to.
+    """
+    if DATA_BACKEND == "local":
+        chunks = local_backend.read_sql_iter(sql, params, chunksize=chunksize)
+    else:
+        chunks = _postgres_iter(sql, params, chunksize, timeout)
+    for chunk in chunks:
+        yield chunk.astype(dtypes) if dtypes else chunk
+
+
+def _postgres_iter(sql, params=None, chunksize=50_000, timeout=None):
+    with _connect() as conn:
+        conn = conn.execution_options(stream_results=True, max_row_buffer=chunksize)
+        _set_statement_timeout(conn, timeout)
+        yield from pd.read_sql(text(sql), conn, params=params, chunksize=chunksize)
+
+
+def sync_local_snapshot(tables=SNAPSHOT_TABLES, chunksize=100_000):
+    """
+    Copy ``tables`` from Postgres into the local Parquet snapshots used by the local backend.
+    Tables are streamed in chunks, so the sync does not need to fit a table in memory.
+    """
+    for table in tables:
+        local_backend.write_table(table, _postgres_iter(f"SELECT * FROM {table}", chunksize=chunksize, timeout=0))
+    query_cache.clear()
+
+
+def cache_stats():
+    """
+    Return hit/miss counters of the query result cache.
+    """
+    return query_cache.stats()
+
+
+def template_stats(*templates):
+    """
+    Return execution counters and latency per query template.
+    """
+    return {template.name: template.stats.snapshot() for template in templates}
+
+
+def pool_stats():
+    """
+    Return connection pool occupancy and usage counters.
+    """
+    stats = pool_metrics.snapshot()
+    stats["status"] = engine.pool.status() if engine is not None else None
+    return stats
+
+
+if __name__ == "__main__":
+    # python -m utils.supabase refreshes the local snapshots
+    sync_local_snapshot()
@@ -1,5 +1,5 @@
 from utils.supabase import select
-from statsmodels.stats.proportion import proportions_chisquare
+from utils.stats import proportions_chisquare_batch
 import pandas as pd
 import vizro.models as vm
 from vizro.tables import dash_ag_grid
@@ -35,15 +35,15 @@ CELL_STYLE = {
 
 
 
-def proportions_chi2(row: pd.Series) -> float:
+def proportions_chi2(df: pd.DataFrame) -> pd.Series:
     """
-    Вычисляет p-value для статистики хи-квадрат.
+    Вычисляет p-value для статистики хи-квадрат сразу для всех строк.
     """
-    _, pval, _ = proportions_chisquare(
-        count=[row['cnt_desktop'], row['cnt_touch']],
-        nobs=[row['platform_total_desktop'], row['platform_total_touch']]
+    _, pval = proportions_chisquare_batch(
+        count=df[['cnt_desktop', 'cnt_touch']],
+        nobs=df[['platform_total_desktop', 'platform_total_touch']]
     )
-    return pval
+    return pd.Series(pval, index=df.index)
 
 def get_table_data(sql=SQL_TEMPLATE, min_cnt=50, range=['2021-09-08', '2021-09-21']) -> pd.DataFrame:
   start_date, end_date = range
@@ -51,7 +51,7 @@ def get_table_data(sql=SQL_TEMPLATE, min_cnt=50, range=['2021-09-08', '2021-09-2
   query_df = select(sql)
   query_df['pct_desktop'] = query_df['count_desktop'] / query_df['desktop_total']
   query_df['pct_touch'] = query_df['count_touch'] / query_df['touch_total']
-  query_df["pval"] = query_df.apply(proportions_chi2, axis=1)
+  query_df["pval"] = proportions_chi2(query_df)
   return query_df.rename(columns={"count_desktop":"Count_desktop", "count_touch":"Count touch",
                                   "pct_desktop":"Count desktop %", "pct_touch":"Count touch %",
                                   "pval": "P-value"})